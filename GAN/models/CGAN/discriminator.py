@@ -32,4 +32,4 @@ class Discriminator(tf.keras.Model):
         image = self.block_image(image)
         label = self.block_label(label)
         out = self.block_combined(tf.concat([image, label], axis=-1))
-        return out
+        return tf.cast(out, tf.float32)
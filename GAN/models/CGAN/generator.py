@@ -35,7 +35,7 @@ class Generator(tf.keras.Model):
         latent = self.block_latent(latent)
         label = self.block_label(label)
         out = self.block_combined(tf.concat([latent, label], axis=-1))
-        out = self.linear_last(out)
+        out = tf.cast(self.linear_last(out), tf.float32)
         if reshape:
             return tf.reshape(out, (-1, *self.image_shape))
         return out
@@ -20,8 +20,10 @@ class DCGAN(BaseModel):
     def model_init(self, conf):
         self.generator = Generator(conf)
         self.discriminator = Discriminator(conf)
-        self.gen_opt = Adam(conf['learning_rate'], conf['beta_1'])
-        self.dis_opt = Adam(conf['learning_rate'], conf['beta_1'])
+        self.gen_opt = self.optimizer(
+            Adam(conf['learning_rate'], conf['beta_1']))
+        self.dis_opt = self.optimizer(
+            Adam(conf['learning_rate'], conf['beta_1']))
         self.set_checkpoint(generator_optimizer=self.gen_opt,
                             discriminator_optimizer=self.dis_opt,
                             generator=self.generator,
@@ -39,24 +41,20 @@ class DCGAN(BaseModel):
         latent = tf.random.normal(shape=self._latent_shape)
         with tf.GradientTape() as d_tape:
             generated_image = self.generator(latent)
-            score_d_real = self.discriminator(inputs)
-            score_d_fake = self.discriminator(generated_image)
+            score_d_real = self.discriminator(self.augment(inputs))
+            score_d_fake = self.discriminator(self.augment(generated_image))
             loss_d = self._bce_loss(tf.ones_like(score_d_real), score_d_real)
             loss_d += self._bce_loss(tf.zeros_like(score_d_fake), score_d_fake)
-        gradient_d = d_tape.gradient(loss_d,
-                                     self.discriminator.trainable_variables)
-        self.dis_opt.apply_gradients(zip(gradient_d,
-                                         self.discriminator.trainable_variables))
+        self.apply_gradients(self.dis_opt, d_tape, loss_d,
+                             self.discriminator.trainable_variables)
 
         latent = tf.random.normal(shape=self._latent_shape)
         with tf.GradientTape() as g_tape:
             generated_image = self.generator(latent)
-            score_g_fake = self.discriminator(generated_image)
+            score_g_fake = self.discriminator(self.augment(generated_image))
             loss_g = self._bce_loss(tf.ones_like(score_g_fake), score_g_fake)
-        gradient_g = g_tape.gradient(loss_g,
-                                     self.generator.trainable_variables)
-        self.gen_opt.apply_gradients(zip(gradient_g,
-                                         self.generator.trainable_variables))
+        self.apply_gradients(self.gen_opt, g_tape, loss_g,
+                             self.generator.trainable_variables)
 
         return {
             'loss/gen': tf.reduce_mean(loss_g),
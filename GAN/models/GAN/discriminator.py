@@ -16,4 +16,4 @@ class Discriminator(tf.keras.Model):
         self.model = tf.keras.Sequential(model, name='discriminator')
 
     def call(self, x):
-        return self.model(x)
+        return tf.cast(self.model(x), tf.float32)
@@ -18,7 +18,7 @@ class Generator(tf.keras.Model):
         self.model = tf.keras.Sequential(model, name='generator')
 
     def call(self, x, reshape=False):
-        x = self.model(x)
+        x = tf.cast(self.model(x), tf.float32)
         if reshape:
             return tf.reshape(x, (-1, *self.image_shape))
         return x
@@ -12,8 +12,8 @@ class GAN(BaseModel):
         super().__init__(conf, ckpt)
         self.generator = Generator(conf)
         self.discriminator = Discriminator()
-        self.gen_opt = Adam(conf['learning_rate'])
-        self.dis_opt = Adam(conf['learning_rate'])
+        self.gen_opt = self.optimizer(Adam(conf['learning_rate']))
+        self.dis_opt = self.optimizer(Adam(conf['learning_rate']))
         self.set_checkpoint(generator_optimizer=self.gen_opt,
                             discriminator_optimizer=self.dis_opt,
                             generator=self.generator,
@@ -27,20 +27,16 @@ class GAN(BaseModel):
         latent = tf.random.normal(shape=self._latent_shape)
         with tf.GradientTape() as g_tape, tf.GradientTape() as d_tape:
             generated_image = self.generator(latent)
-            score_real = self.discriminator(x)
-            score_fake = self.discriminator(generated_image)
+            score_real = self.discriminator(self.augment(x))
+            score_fake = self.discriminator(self.augment(generated_image))
             loss_g = self._bce_loss(tf.ones_like(score_fake), score_fake)
             loss_d = self._bce_loss(tf.ones_like(score_real), score_real)
             loss_d += self._bce_loss(tf.zeros_like(score_fake), score_fake)
 
-        gradient_g = g_tape.gradient(loss_g,
-                                     self.generator.trainable_variables)
-        gradient_d = d_tape.gradient(loss_d,
-                                     self.discriminator.trainable_variables)
-        self.gen_opt.apply_gradients(zip(gradient_g,
-                                         self.generator.trainable_variables))
-        self.dis_opt.apply_gradients(zip(gradient_d,
-                                         self.discriminator.trainable_variables))
+        self.apply_gradients(self.gen_opt, g_tape, loss_g,
+                             self.generator.trainable_variables)
+        self.apply_gradients(self.dis_opt, d_tape, loss_d,
+                             self.discriminator.trainable_variables)
 
         log_dict = {
             'loss/gen': loss_g,
@@ -12,8 +12,8 @@ class WGAN(BaseModel):
         super().__init__(conf, ckpt)
         self.generator = Generator(conf)
         self.discriminator = Discriminator(conf)
-        self.gen_opt = RMSprop(conf['learning_rate'])
-        self.dis_opt = RMSprop(conf['learning_rate'])
+        self.gen_opt = self.optimizer(RMSprop(conf['learning_rate']))
+        self.dis_opt = self.optimizer(RMSprop(conf['learning_rate']))
         self.set_checkpoint(generator_optimizer=self.gen_opt,
                             discriminator_optimizer=self.dis_opt,
                             generator=self.generator,
@@ -21,18 +21,17 @@ class WGAN(BaseModel):
 
         self.clip_const = conf['clip_const']
         self._latent_shape = (conf['batch_size'], conf['latent_dim'])
+        self.n_critic = conf['n_critic']
 
     @tf.function
     def train_generator(self):
         latent = tf.random.normal(shape=self._latent_shape)
         with tf.GradientTape() as g_tape:
             generated_image = self.generator(latent)
-            score_g_fake = self.discriminator(generated_image)
+            score_g_fake = self.discriminator(self.augment(generated_image))
             loss_g = -tf.reduce_mean(score_g_fake)
-        gradient_g = g_tape.gradient(loss_g,
-                                     self.generator.trainable_variables)
-        self.gen_opt.apply_gradients(zip(gradient_g,
-                                         self.generator.trainable_variables))
+        self.apply_gradients(self.gen_opt, g_tape, loss_g,
+                             self.generator.trainable_variables)
 
         log_dict = {'loss/gen': loss_g}
         self.write_scalar_log(**log_dict)
@@ -43,14 +42,12 @@ class WGAN(BaseModel):
         latent = tf.random.normal(shape=self._latent_shape)
         with tf.GradientTape() as d_tape:
             generated_image = self.generator(latent)
-            score_d_real = self.discriminator(x)
-            score_d_fake = self.discriminator(generated_image)
+            score_d_real = self.discriminator(self.augment(x))
+            score_d_fake = self.discriminator(self.augment(generated_image))
             loss_d = tf.reduce_mean(score_d_fake)
             loss_d -= tf.reduce_mean(score_d_real)
-        gradient_d = d_tape.gradient(loss_d,
-                                     self.discriminator.trainable_variables)
-        self.dis_opt.apply_gradients(zip(gradient_d,
-                                         self.discriminator.trainable_variables))
+        self.apply_gradients(self.dis_opt, d_tape, loss_d,
+                             self.discriminator.trainable_variables)
 
         for w in self.discriminator.trainable_variables:
             clipped_w = tf.clip_by_value(w, -self.clip_const, self.clip_const)
@@ -65,6 +62,19 @@ class WGAN(BaseModel):
         self.ckpt.step.assign_add(1)
         return log_dict
 
+    @tf.function
+    def train_cycle(self, batches):
+        """
+        One critic step on each of the `n_critic` `batches`, then one
+        generator step, in a single call.
+        Critic logs are averaged over the cycle.
+        """
+        logs = [self.train_discriminator(x) for x in batches]
+        log_dict = {key: tf.reduce_mean([log[key] for log in logs])
+                    for key in logs[0]}
+        log_dict.update(self.train_generator())
+        return log_dict
+
     def test(self, x, step=None, save=False, display_shape=None):
         if step is None:
             step = self.ckpt.step
@@ -51,4 +51,4 @@ class Discriminator(tf.keras.Model):
         self.model.summary()
 
     def call(self, x):
-        return self.model(x)
+        return tf.cast(self.model(x), tf.float32)
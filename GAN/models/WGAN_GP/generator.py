@@ -59,4 +59,4 @@ class Generator(tf.keras.Model):
         self.model.summary()
 
     def call(self, x):
-        return self.model(x)
+        return tf.cast(self.model(x), tf.float32)
@@ -12,8 +12,10 @@ class WGAN_GP(BaseModel):
         super().__init__(conf, ckpt)
         self.generator = Generator(conf)
         self.discriminator = Discriminator(conf)
-        self.gen_opt = Adam(conf['learning_rate'], conf['beta_1'])
-        self.dis_opt = Adam(conf['learning_rate'], conf['beta_1'])
+        self.gen_opt = self.optimizer(
+            Adam(conf['learning_rate'], conf['beta_1']))
+        self.dis_opt = self.optimizer(
+            Adam(conf['learning_rate'], conf['beta_1']))
         self.set_checkpoint(generator_optimizer=self.gen_opt,
                             discriminator_optimizer=self.dis_opt,
                             generator=self.generator,
@@ -21,18 +23,17 @@ class WGAN_GP(BaseModel):
 
         self.penalty_lambda = conf['penalty_lambda']
         self._latent_shape = (conf['batch_size'], conf['latent_dim'])
+        self.n_critic = conf['n_critic']
 
     @tf.function
     def train_generator(self):
         latent = tf.random.normal(shape=self._latent_shape)
         with tf.GradientTape() as g_tape:
             generated_image = self.generator(latent)
-            score_g_fake = self.discriminator(generated_image)
+            score_g_fake = self.discriminator(self.augment(generated_image))
             loss_g = -tf.reduce_mean(score_g_fake)
-        gradient_g = g_tape.gradient(loss_g,
-                                     self.generator.trainable_variables)
-        self.gen_opt.apply_gradients(zip(gradient_g,
-                                         self.generator.trainable_variables))
+        self.apply_gradients(self.gen_opt, g_tape, loss_g,
+                             self.generator.trainable_variables)
 
         log_dict = {'loss/gen': loss_g}
         self.write_scalar_log(**log_dict)
@@ -43,8 +44,8 @@ class WGAN_GP(BaseModel):
         latent = tf.random.normal(shape=self._latent_shape)
         with tf.GradientTape() as d_tape:
             generated_image = self.generator(latent)
-            score_d_real = self.discriminator(x)
-            score_d_fake = self.discriminator(generated_image)
+            score_d_real = self.discriminator(self.augment(x))
+            score_d_fake = self.discriminator(self.augment(generated_image))
             penalty, score_d_interpolation = \
                 self.gradient_penalty(x, generated_image)
             penalty *= self.penalty_lambda
@@ -52,10 +53,8 @@ class WGAN_GP(BaseModel):
             loss_d = tf.reduce_mean(score_d_fake)
             loss_d -= tf.reduce_mean(score_d_real)
             loss_d += penalty
-        gradient_d = d_tape.gradient(loss_d,
-                                     self.discriminator.trainable_variables)
-        self.dis_opt.apply_gradients(zip(gradient_d,
-                                         self.discriminator.trainable_variables))
+        self.apply_gradients(self.dis_opt, d_tape, loss_d,
+                             self.discriminator.trainable_variables)
 
         log_dict = {
             'loss/dis': loss_d,
@@ -68,6 +67,19 @@ class WGAN_GP(BaseModel):
         self.ckpt.step.assign_add(1)
         return log_dict
 
+    @tf.function
+    def train_cycle(self, batches):
+        """
+        One critic step on each of the `n_critic` `batches`, then one
+        generator step, in a single call.
+        Critic logs are averaged over the cycle.
+        """
+        logs = [self.train_discriminator(x) for x in batches]
+        log_dict = {key: tf.reduce_mean([log[key] for log in logs])
+                    for key in logs[0]}
+        log_dict.update(self.train_generator())
+        return log_dict
+
     def test(self, x, step=None, save=False, display_shape=None):
         if step is None:
             step = self.ckpt.step
@@ -93,8 +105,13 @@ class WGAN_GP(BaseModel):
         with tf.GradientTape() as gp_tape:
             gp_tape.watch(interpolation)
             score_d_interpolation = self.discriminator(interpolation)
-        gradient = gp_tape.gradient(score_d_interpolation,
-                                    interpolation)
+        # scaled like the critic loss, so float16 gradients do not
+        # underflow, then unscaled and reduced in float32
+        loss_scale = self.loss_scale(self.dis_opt)
+        gradient = gp_tape.gradient(
+            score_d_interpolation, interpolation,
+            output_gradients=tf.ones_like(score_d_interpolation) * loss_scale)
+        gradient = tf.cast(gradient, tf.float32) / loss_scale
         norm = tf.sqrt(tf.reduce_sum(tf.square(gradient), axis=(1, 2, 3)))
         penalty = tf.reduce_mean((norm - 1.0)**2)
         return penalty, score_d_interpolation
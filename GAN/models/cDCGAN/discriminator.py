@@ -33,4 +33,4 @@ class Discriminator(tf.keras.Model):
         labels = tf.reshape(labels, (batch, -1, 1, 1))
         labels = tf.tile(labels, (1, 1, h, w))
         inputs = tf.concat((images, labels), axis=1)
-        return self.model(inputs)
+        return tf.cast(self.model(inputs), tf.float32)
@@ -33,4 +33,4 @@ class Generator(tf.keras.Model):
 
     def call(self, latent, label):
         inputs = tf.concat((latent, label), axis=-1)
-        return self.model(inputs)
+        return tf.cast(self.model(inputs), tf.float32)
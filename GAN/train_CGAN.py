@@ -1,9 +1,9 @@
 import argparse
-import tqdm
 import tensorflow as tf
 
 from utils import str_to_bool, get_config, find_config, check_dataset_config
 from utils import allow_memory_growth, ImageLoader
+from layers import Trainer
 from models import CGAN
 
 
@@ -47,13 +47,14 @@ def main():
     check_dataset_config(conf)
 
     """Load Dataset"""
-    loader = ImageLoader(data_txt_file=conf['dataset']['train_data_txt'],
-                         use_label=True)
+    loader = ImageLoader.from_config(conf['dataset'], use_label=True)
     conf['n_class'] = loader.n_class
 
     train_dataset = loader.get_dataset(batch_size=conf['batch_size'],
                                        channel=conf['channel'],
-                                       flatten=True)
+                                       flatten=True,
+                                       seed=conf['random_seed'],
+                                       repeat=True)
 
     labels = loader.get_label(str_label=map(str, range(conf['n_class'])))
     test_data = make_test_data(numeric_labels=labels,
@@ -71,22 +72,23 @@ def main():
         model.copy_conf(args['config'])
 
     """Start Train"""
-    start_epoch = model.ckpt.step // len(train_dataset) + 1
-    pbar = tqdm.trange(start_epoch, conf['epochs']+1,
-                       position=0, leave=True)
-    for epoch in pbar:
-        for iteration, image_batch in enumerate(train_dataset):
-            log_dict = model.train(image_batch)
-            loss_g = log_dict['loss/gen']
-            loss_d = log_dict['loss/dis']
-
-            if (iteration + 1) % 10 == 0:
-                pbar.set_postfix({'Current Epoch': epoch,
-                                  'G': '{:.4f}'.format(loss_g),
-                                  'D': '{:.4f}'.format(loss_d)})
-        if epoch % 1 == 0:
-            model.test(test_data, epoch, save=True,
-                       display_shape=display_shape)
+    steps_per_epoch = loader.steps_per_epoch(conf['batch_size'])
+    loader.set_position(model.ckpt.step)
+
+    def test_func(step):
+        model.test(test_data, step // steps_per_epoch, save=True,
+                   display_shape=display_shape)
+
+    trainer = Trainer(model, train_dataset,
+                      end_step=conf['epochs'] * steps_per_epoch,
+                      steps_per_execution=conf.get('steps_per_execution', 1),
+                      log_step=conf.get('log_step', 10),
+                      test_step=steps_per_epoch,
+                      test_func=test_func,
+                      postfix={'G': 'loss/gen', 'D': 'loss/dis'},
+                      loader=loader,
+                      steps_per_epoch=steps_per_epoch)
+    trainer.run()
 
 
 if __name__ == '__main__':
@@ -1,9 +1,9 @@
 import argparse
-import tqdm
 import tensorflow as tf
 
 from utils import str_to_bool, get_config, find_config, check_dataset_config
 from utils import allow_memory_growth, ImageLoader
+from layers import Trainer
 from models import GAN
 
 
@@ -26,10 +26,12 @@ def main():
     check_dataset_config(conf)
 
     """Load Dataset"""
-    loader = ImageLoader(data_txt_file=conf['dataset']['train_data_txt'])
+    loader = ImageLoader.from_config(conf['dataset'])
     train_dataset = loader.get_dataset(batch_size=conf['batch_size'],
                                        channel=conf['channel'],
-                                       flatten=True)
+                                       flatten=True,
+                                       seed=conf['random_seed'],
+                                       repeat=True)
 
     test_data = tf.random.normal(shape=(conf['test_batch_size'], conf['latent_dim']),
                                  seed=conf['random_seed'])
@@ -40,21 +42,22 @@ def main():
         model.copy_conf(args['config'])
 
     """Start Train"""
-    start_epoch = model.ckpt.step // len(train_dataset) + 1
-    pbar = tqdm.trange(start_epoch, conf['epochs']+1,
-                       position=0, leave=True)
-    for epoch in pbar:
-        for iteration, image_batch in enumerate(train_dataset):
-            log_dict = model.train(image_batch)
-            loss_g = log_dict['loss/gen']
-            loss_d = log_dict['loss/dis']
-
-            if (iteration + 1) % 10 == 0:
-                pbar.set_postfix({'Current Epoch': epoch,
-                                  'G': '{:.4f}'.format(loss_g),
-                                  'D': '{:.4f}'.format(loss_d)})
-        if epoch % 1 == 0:
-            model.test(test_data, epoch, save=True)
+    steps_per_epoch = loader.steps_per_epoch(conf['batch_size'])
+    loader.set_position(model.ckpt.step)
+
+    def test_func(step):
+        model.test(test_data, step // steps_per_epoch, save=True)
+
+    trainer = Trainer(model, train_dataset,
+                      end_step=conf['epochs'] * steps_per_epoch,
+                      steps_per_execution=conf.get('steps_per_execution', 1),
+                      log_step=conf.get('log_step', 10),
+                      test_step=steps_per_epoch,
+                      test_func=test_func,
+                      postfix={'G': 'loss/gen', 'D': 'loss/dis'},
+                      loader=loader,
+                      steps_per_epoch=steps_per_epoch)
+    trainer.run()
 
 
 if __name__ == '__main__':
@@ -1,10 +1,10 @@
 import math
 import argparse
-import tqdm
 import tensorflow as tf
 
 from utils import str_to_bool, get_config, find_config, check_dataset_config
 from utils import allow_memory_growth, ImageLoader
+from layers import Trainer
 from models import WGAN_GP
 
 
@@ -30,10 +30,13 @@ def main():
 
     """Load Dataset"""
     dataset_conf = conf['dataset']
-    loader = ImageLoader(data_txt_file=dataset_conf['train_data_txt'])
+    loader = ImageLoader.from_config(dataset_conf)
     train_dataset = loader.get_dataset(batch_size=conf['batch_size'],
+                                       channel=conf['channel'],
                                        new_size=(conf['input_size'],)*2,
-                                       cache=dataset_conf['cache'])
+                                       cache=dataset_conf['cache'],
+                                       seed=conf['random_seed'],
+                                       repeat=True)
 
     test_data = tf.random.normal(shape=(conf['test_batch_size'], conf['latent_dim']),
                                  seed=conf['random_seed'])
@@ -44,44 +47,28 @@ def main():
         model.copy_conf(args['config'])
 
     """Start Train"""
-    start_epoch = model.ckpt.step // len(train_dataset) + 1
-    epoch_by_step = math.ceil(conf['steps'] / len(train_dataset))
+    steps_per_epoch = loader.steps_per_epoch(conf['batch_size'])
+    loader.set_position(model.ckpt.step)
+    epoch_by_step = math.ceil(conf['steps'] / steps_per_epoch)
     if conf['epochs'] < epoch_by_step:
         conf['epochs'] = epoch_by_step
     else:
-        conf['steps'] = conf['epochs'] * len(train_dataset)
-    n_critic = conf['n_critic']
-    test_step = conf['test_step']
-    save_step = conf['save_step']
-    end_step = conf['steps']
-
-    loss_g = 0
-    pbar = tqdm.trange(start_epoch, conf['epochs']+1,
-                       position=0, leave=True)
-    pbar_dict = dict()
-    for epoch in pbar:
-        pbar.set_postfix({'Current Epoch': epoch})
-        sub_pbar = tqdm.tqdm(train_dataset, leave=False)
-        for image_batch in sub_pbar:
-            log_dict_dis = model.train_discriminator(image_batch)
-
-            current_step = model.ckpt.step.numpy()
-
-            if current_step % n_critic == 0:
-                log_dict_gen = model.train_generator()
-                loss_g = log_dict_gen['loss/gen']
-
-            if current_step % 10 == 0:
-                pbar_dict['Step'] = current_step
-                pbar_dict['G'] = '{:.4f}'.format(loss_g)
-                pbar_dict['D'] = '{:.4f}'.format(log_dict_dis['loss/dis'])
-                sub_pbar.set_postfix(pbar_dict)
-            if test_step and current_step % test_step == 0:
-                model.test(test_data, current_step, save=True)
-            if save_step and current_step % save_step == 0:
-                model.save()
-            if current_step == end_step:
-                return
+        conf['steps'] = conf['epochs'] * steps_per_epoch
+
+    def test_func(step):
+        model.test(test_data, step, save=True)
+
+    trainer = Trainer(model, train_dataset,
+                      end_step=conf['steps'],
+                      steps_per_execution=conf.get('steps_per_execution', 1),
+                      log_step=conf.get('log_step', 10),
+                      test_step=conf['test_step'],
+                      save_step=conf['save_step'],
+                      test_func=test_func,
+                      postfix={'G': 'loss/gen', 'D': 'loss/dis'},
+                      loader=loader,
+                      steps_per_epoch=steps_per_epoch)
+    trainer.run()
 
 
 if __name__ == '__main__':
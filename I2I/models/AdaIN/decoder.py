@@ -42,4 +42,4 @@ class Decoder(tf.keras.Model):
         self.model.summary()
 
     def call(self, inputs):
-        return self.model(inputs)
+        return tf.cast(self.model(inputs), tf.float32)
@@ -29,4 +29,6 @@ class Encoder(tf.keras.Model):
         if clip:
             inputs = tf.clip_by_value(inputs, 0, 255)
         # inputs = preprocess_input(inputs)
-        return self.model(inputs)
+        features = self.model(inputs)
+        return tf.nest.map_structure(
+            lambda f: tf.cast(f, tf.float32), features)
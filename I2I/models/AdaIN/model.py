@@ -13,8 +13,9 @@ class AdaIN(BaseModel):
         super().__init__(conf, ckpt)
         self.encoder = Encoder(conf)
         self.decoder = Decoder(conf)
-        self.adain = layers.AdaIN()
-        self.opt = Adam(conf['learning_rate'], conf['beta_1'])
+        # feature statistics stay in float32 under mixed precision
+        self.adain = layers.AdaIN(dtype='float32')
+        self.opt = self.optimizer(Adam(conf['learning_rate'], conf['beta_1']))
         self.set_checkpoint(decoder=self.decoder,
                             optimizer=self.opt)
         self.content_weight = conf['content_weight']
@@ -33,9 +34,8 @@ class AdaIN(BaseModel):
                 [adain_outputs], [generated_features[-1]]) * self.content_weight
             style_loss = self.style_loss(style_features, generated_features)
             loss = content_loss + style_loss
-        gradient = tape.gradient(loss, self.decoder.trainable_variables)
-        self.opt.apply_gradients(zip(gradient,
-                                     self.decoder.trainable_variables))
+        self.apply_gradients(self.opt, tape, loss,
+                             self.decoder.trainable_variables)
 
         log_dict = {
             'loss/content': content_loss,
@@ -32,4 +32,6 @@ class FeatureExtractor(tf.keras.Model):
             inputs = inputs * 127.5 + 127.5
         if clip:
             inputs = tf.clip_by_value(inputs, 0, 255)
-        return self.model(preprocess_input(inputs))
+        features = self.model(preprocess_input(inputs))
+        return tf.nest.map_structure(
+            lambda f: tf.cast(f, tf.float32), features)
@@ -13,7 +13,7 @@ class FastStyleTransfer(BaseModel):
         super().__init__(conf, ckpt)
         self.feature_extractor = FeatureExtractor(conf['feature_extrator'])
         self.transform_net = TransformNet(conf)
-        self.opt = Adam(conf['learning_rate'], conf['beta_1'])
+        self.opt = self.optimizer(Adam(conf['learning_rate'], conf['beta_1']))
         self.set_checkpoint(transform_net=self.transform_net,
                             optimizer=self.opt)
 
@@ -35,9 +35,8 @@ class FastStyleTransfer(BaseModel):
             total_variation_loss = self.total_variation_loss(generated_image)
             total_variation_loss *= self.total_variation_weight
             loss = content_loss + style_loss + total_variation_loss
-        gradient = tape.gradient(loss, self.transform_net.trainable_variables)
-        self.opt.apply_gradients(zip(gradient,
-                                     self.transform_net.trainable_variables))
+        self.apply_gradients(self.opt, tape, loss,
+                             self.transform_net.trainable_variables)
 
         log_dict = {
             'loss/content': content_loss,
@@ -74,7 +73,8 @@ class FastStyleTransfer(BaseModel):
         out = 0
         for i, c in zip(inputs, content):
             # prod_shape: H * W * C
-            prod_shape = tf.cast(tf.reduce_prod(i.shape[1:]), dtype=tf.float32)
+            prod_shape = tf.cast(tf.reduce_prod(tf.shape(i)[1:]),
+                                 dtype=tf.float32)
             out += tf.reduce_sum(tf.square(i - c), axis=(1, 2, 3)) / prod_shape
         return 0.5 * tf.reduce_mean(out)
 
@@ -82,13 +82,14 @@ class FastStyleTransfer(BaseModel):
         out = 0
         for i, style_gram in zip(inputs, self.style_gram):
             # prod_shape: H * W * C
-            prod_shape = tf.cast(tf.reduce_prod(i.shape[1:]), dtype=tf.float32)
+            prod_shape = tf.cast(tf.reduce_prod(tf.shape(i)[1:]),
+                                 dtype=tf.float32)
             matrix = (calculate_gram_matrix(i) - style_gram) / prod_shape
             out += tf.reduce_sum(tf.square(matrix), axis=(1, 2)) / prod_shape
         return tf.reduce_mean(out)
 
     def total_variation_loss(self, inputs):
-        H, W = inputs.shape[-2:]
+        H, W = tf.unstack(tf.cast(tf.shape(inputs)[-2:], tf.float32))
         h_variation = tf.reduce_sum(
             tf.abs(inputs[..., 1:, :] - inputs[..., :-1, :]), axis=(1, 2, 3))
         w_variation = tf.reduce_sum(
@@ -48,4 +48,4 @@ class TransformNet(tf.keras.Model):
         self.model.summary()
 
     def call(self, inputs):
-        return self.model(inputs)
+        return tf.cast(self.model(inputs), tf.float32)
@@ -10,7 +10,7 @@ class NeuralStyleTransfer(BaseModel):
     def __init__(self, conf, init_image, content_image, style_image):
         super().__init__(conf)
         self.feature_extractor = FeatureExtractor(conf)
-        self.opt = Adam(conf['learning_rate'], conf['beta_1'])
+        self.opt = self.optimizer(Adam(conf['learning_rate'], conf['beta_1']))
         self.set_checkpoint(optimizer=self.opt)
 
         self.drawing_image = tf.Variable(init_image)
@@ -35,8 +35,7 @@ class NeuralStyleTransfer(BaseModel):
             content_loss *= self.content_weight
             style_loss = self.style_loss(style_drawing)
             loss = content_loss + style_loss
-        gradient = tape.gradient(loss, self.drawing_image)
-        self.opt.apply_gradients([(gradient, self.drawing_image)])
+        self.apply_gradients(self.opt, tape, loss, [self.drawing_image])
 
         clipped_image = tf.clip_by_value(self.drawing_image, -1, 1)
         self.drawing_image.assign(clipped_image)
@@ -10,7 +10,10 @@ def calculate_gram_matrix(matrix, data_format=None):
     if data_format == 'channels_last':
         matrix = tf.transpose(matrix, (0, 3, 1, 2))
 
-    flatten_matrix = tf.reshape(matrix, (*matrix.shape[:2], -1))
+    # accumulate in float32, also under mixed precision
+    matrix = tf.cast(matrix, tf.float32)
+    shape = tf.shape(matrix)
+    flatten_matrix = tf.reshape(matrix, (shape[0], shape[1], -1))
     transposed_flatten_matrix = tf.transpose(flatten_matrix, (0, 2, 1))
     gram_matrix = tf.matmul(flatten_matrix, transposed_flatten_matrix)
 
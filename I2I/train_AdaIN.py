@@ -1,10 +1,9 @@
-import math
 import argparse
-import tqdm
 import tensorflow as tf
 
 from utils import str_to_bool, get_config, find_config, check_dataset_config
 from utils import allow_memory_growth, ImageLoader
+from layers import Trainer
 from models import AdaIN
 
 
@@ -33,24 +32,29 @@ def main():
     dataset_conf = conf['dataset']
     content_conf = dataset_conf['content']
     style_conf = dataset_conf['style']
-    content_loader = ImageLoader(data_txt_file=content_conf['train_data_txt'])
+    content_loader = ImageLoader.from_config(content_conf)
     content_dataset = content_loader.get_dataset(
         batch_size=conf['batch_size'],
         new_size=(conf['input_size'],)*2,
-        cache=content_conf['cache'])
-    style_loader = ImageLoader(data_txt_file=style_conf['train_data_txt'])
+        cache=content_conf['cache'],
+        seed=conf['random_seed'],
+        repeat=True)
+    style_loader = ImageLoader.from_config(style_conf)
     style_dataset = style_loader.get_dataset(batch_size=conf['batch_size'],
                                              new_size=(conf['input_size'],)*2,
-                                             cache=style_conf['cache'])
-    train_dataset = tf.data.Dataset.zip(
-        (content_dataset, style_dataset)).repeat()
+                                             cache=style_conf['cache'],
+                                             seed=conf['random_seed'],
+                                             repeat=True)
+    train_dataset = tf.data.Dataset.zip((content_dataset, style_dataset))
 
     test_content = next(iter(
         content_loader.get_dataset(batch_size=conf['test_batch_size'],
-                                   new_size=(conf['input_size'],)*2)))
+                                   new_size=(conf['input_size'],)*2,
+                                   cache=False)))
     test_style = next(iter(
         style_loader.get_dataset(batch_size=conf['test_batch_size'],
-                                 new_size=(conf['input_size'],)*2)))
+                                 new_size=(conf['input_size'],)*2,
+                                 cache=False)))
     test_data = (test_content, test_style)
 
     """Model Initiate"""
@@ -60,34 +64,22 @@ def main():
         model.test(test_data, save_input=True)
 
     """Start Train"""
-    start_step = model.ckpt.step.numpy()
-    test_step = conf['test_step']
-    save_step = conf['save_step']
-    end_step = conf['steps']
+    content_loader.set_position(model.ckpt.step)
+    style_loader.set_position(model.ckpt.step)
 
-    pbar = tqdm.trange(start_step, end_step,
-                       position=0, leave=True)
-    pbar_dict = dict()
-    train_iter = iter(train_dataset)
-    for _ in pbar:
-        image_batch = next(train_iter)
-        log_dict = model.train(image_batch)
+    def test_func(step):
+        model.test(test_data, step, save=True)
 
-        current_step = model.ckpt.step.numpy()
-
-        if current_step % 1 == 0:
-            pbar_dict.update({
-                'Step': current_step,
-                'Content': '{:.4f}'.format(log_dict['loss/content']),
-                'Style': '{:.4f}'.format(log_dict['loss/style'])
-            })
-            pbar.set_postfix(pbar_dict)
-        if test_step and current_step % test_step == 0:
-            model.test(test_data, current_step, save=True)
-        if save_step and current_step % save_step == 0:
-            model.save()
-        if current_step == end_step:
-            return
+    trainer = Trainer(model, train_dataset,
+                      end_step=conf['steps'],
+                      steps_per_execution=conf.get('steps_per_execution', 1),
+                      log_step=conf.get('log_step', 10),
+                      test_step=conf['test_step'],
+                      save_step=conf['save_step'],
+                      test_func=test_func,
+                      postfix={'Content': 'loss/content',
+                               'Style': 'loss/style'})
+    trainer.run()
 
 
 if __name__ == '__main__':
@@ -1,9 +1,9 @@
 import argparse
-import tqdm
 import tensorflow as tf
 
 from utils import str_to_bool, get_config
 from utils import allow_memory_growth, read_images
+from layers import Trainer
 from models import NeuralStyleTransfer
 
 
@@ -65,22 +65,18 @@ def main():
     model = NeuralStyleTransfer(conf, init_image, content_image, style_image)
 
     """Start Train"""
-    test_step = conf['test_step']
-    pbar = tqdm.trange(conf['steps'], position=0, leave=True)
-    pbar_dict = dict()
-    for _ in pbar:
-        log_dict = model.train()
-
-        current_step = model.ckpt.step.numpy()
-        if current_step % 10 == 0:
-            pbar_dict.update({
-                'Step': current_step,
-                'Content': '{:.4f}'.format(log_dict['loss/content']),
-                'Style': '{:.4f}'.format(log_dict['loss/style'])
-            })
-            pbar.set_postfix(pbar_dict)
-        if test_step and current_step % test_step == 0:
-            model.write_drawing_image(init_shape, current_step, save=True)
+    def test_func(step):
+        model.write_drawing_image(init_shape, step, save=True)
+
+    trainer = Trainer(model,
+                      end_step=conf['steps'],
+                      steps_per_execution=conf.get('steps_per_execution', 1),
+                      log_step=conf.get('log_step', 10),
+                      test_step=conf['test_step'],
+                      test_func=test_func,
+                      postfix={'Content': 'loss/content',
+                               'Style': 'loss/style'})
+    trainer.run()
 
 
 if __name__ == '__main__':
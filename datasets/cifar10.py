@@ -3,9 +3,10 @@ import glob
 import shutil
 import argparse
 import pickle
+import numpy as np
 from tqdm import tqdm
 from PIL import Image
-from dataset_utils import check_archive
+from dataset_utils import check_archive, write_array_store
 
 
 def unpickle(file):
@@ -14,12 +15,48 @@ def unpickle(file):
     return data
 
 
+def read_batches(batches):
+    """
+    Concatenate pickled batches with one vectorized read.
+    Returns uint8 images (N, 3, 32, 32), labels (N,) and file names.
+    """
+    images, labels, names = [], [], []
+    for batch in batches:
+        data = unpickle(batch)
+        images.append(np.frombuffer(data[b'data'], np.uint8))
+        labels.append(np.asarray(data[b'labels'], np.int64))
+        names.extend(name.decode() for name in data[b'filenames'])
+    images = np.concatenate(images).reshape(-1, 3, 32, 32)
+    return images, np.concatenate(labels), names
+
+
+def write_images(batches, labels, prefix):
+    images, image_labels, names = read_batches(batches)
+    for image, label, image_name in zip(tqdm(images), image_labels, names):
+        image_dir = os.path.join(prefix, labels[label])
+        os.makedirs(image_dir, exist_ok=True)
+        Image.fromarray(image.transpose(1, 2, 0)).save(
+            os.path.join(image_dir, image_name))
+
+
+def write_store(batches, labels, store_dir):
+    images, image_labels, _ = read_batches(batches)
+    write_array_store(store_dir,
+                      images=images,
+                      labels=image_labels,
+                      class_names=labels)
+
+
 def main():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('-p', '--path',
                             help='Path of archive file', type=str)
     arg_parser.add_argument('-o', '--output_dir', default='./cifar10',
                             help='Path of output directory', type=str)
+    arg_parser.add_argument('-f', '--format', default='png',
+                            choices=('png', 'memmap'),
+                            help='png files, or memmap stores for ' +
+                            "backend 'memmap' (default=png)", type=str)
     args = vars(arg_parser.parse_args())
 
     """Extract Archive"""
@@ -32,14 +69,11 @@ def main():
     label, *batches = sorted(files)
     labels = [l.decode() for l in unpickle(label)[b'label_names']]
 
-    train_test = ['train']*(len(batches)-1) + ['test']
-    for t, batch in tqdm(tuple(zip(train_test, batches))):
-        for label, data, image_name in zip(*list(unpickle(batch).values())[1:]):
-            image_dir = os.path.join(args['output_dir'], t, labels[label])
-            os.makedirs(image_dir, exist_ok=True)
-            image = data.reshape(3, 32, 32).transpose(1, 2, 0)
-            image_path = os.path.join(image_dir, image_name.decode())
-            Image.fromarray(image).save(image_path)
+    write_func = write_images if args['format'] == 'png' else write_store
+    write_func(batches[:-1], labels,
+               os.path.join(args['output_dir'], 'train'))
+    write_func(batches[-1:], labels,
+               os.path.join(args['output_dir'], 'test'))
 
     shutil.rmtree(extract_path)
 
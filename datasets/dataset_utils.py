@@ -1,5 +1,6 @@
 import os
 import re
+import sys
 
 
 def check_archive(path):
@@ -10,3 +11,30 @@ def check_archive(path):
     if archive_name is None:
         raise NameError('archive file has no extension.')
     return archive_name.group()
+
+
+def write_array_store(store_dir, images, labels, class_names):
+    """
+    Write uint8 images (N, C, H, W) and labels as the memmap store
+    read by ImageLoader(backend='memmap').
+    """
+    # tf_utils imports tensorflow, only needed for this output
+    sys.path.append(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    from tf_utils import write_store_meta
+    from tf_utils.array_store import create_array_store
+
+    n_data, channel, height, width = images.shape
+    images_store, labels_store = create_array_store(
+        store_dir, n_data, (channel, height, width), use_label=True)
+    images_store[:] = images
+    labels_store[:] = labels
+    images_store.flush()
+    labels_store.flush()
+    write_store_meta(store_dir,
+                     n_data=n_data,
+                     height=height,
+                     width=width,
+                     channel=channel,
+                     use_label=True,
+                     class_names=list(class_names))
@@ -1,48 +1,84 @@
 import os
 import glob
+import time
 import tqdm
+import shutil
 import argparse
-import numpy as np
 import multiprocessing
+from collections import Counter
 from PIL import Image
 
+SUMMARY_FILE = 'resize_summary.txt'
 
-def split(a, n):
-    k, m = divmod(len(a), n)
-    return (a[i * k + min(i, m):(i + 1) * k + min(i + 1, m)] for i in range(n))
 
+def is_up_to_date(image, output):
+    if not os.path.exists(output):
+        return False
+    return os.path.getmtime(output) >= os.path.getmtime(image)
 
-def run(inputs):
-    index, images, args = inputs
-    resolution = args['resolution']
-    output_dir = args['output_dir']
-    pbar = tqdm.tqdm(images, position=index, leave=True)
-    for image in pbar:
-        genre = os.path.basename(os.path.dirname(image))
-        output_path = os.path.join(output_dir, genre)
-        image_name = os.path.basename(image)
-        os.makedirs(output_path, exist_ok=True)
-
-        i = Image.open(image)
-        if not np.array(i).shape:
-            pbar.set_postfix({
-                'f': image_name,
-                'e': 'load_fail',
-                'size': (w, h)})
-            continue
 
+def resize(image, output, resolution):
+    """
+    Resize the shorter side to `resolution`, or copy smaller images.
+    JPEGs are reduced while decoding with `draft`, and the output
+    is written through a temporary file, so reruns never see
+    a partial output.
+    """
+    with Image.open(image) as i:
         w, h = i.size
-        if min(w, h) < resolution:
-            i.save(os.path.join(output_path, image_name))
-            continue
-
-        pbar.set_postfix({
-            'f': image_name,
-            'e': 'resize',
-            'size': (w, h)})
         scale = min(w, h) / resolution
-        i.resize((int(w // scale), int(h // scale))).save(
-            os.path.join(output_path, image_name))
+        size = (int(w // scale), int(h // scale))
+        if scale > 1:
+            # decode at the smallest DCT scale not below the target
+            i.draft(i.mode, size)
+        i.load()
+
+        root, ext = os.path.splitext(output)
+        temp_output = f'{root}.part{ext}'
+        try:
+            if scale <= 1:
+                shutil.copyfile(image, temp_output)
+                status = 'copied'
+            else:
+                resized = i.resize(size)
+                if ext.lower() in ('.jpg', '.jpeg') and \
+                        resized.mode not in ('RGB', 'L'):
+                    resized = resized.convert('RGB')
+                resized.save(temp_output)
+                status = 'resized'
+            os.replace(temp_output, output)
+        except BaseException:
+            # the temp file has an image extension, scans would list it
+            if os.path.exists(temp_output):
+                os.remove(temp_output)
+            raise
+    return status
+
+
+def run(inputs):
+    image, args = inputs
+    genre = os.path.basename(os.path.dirname(image))
+    output_path = os.path.join(args['output_dir'], genre)
+    output = os.path.join(output_path, os.path.basename(image))
+    if args['incremental'] and is_up_to_date(image, output):
+        return image, 'skipped', ''
+
+    os.makedirs(output_path, exist_ok=True)
+    try:
+        return image, resize(image, output, args['resolution']), ''
+    except Exception as e:
+        return image, 'failed', f'{type(e).__name__}: {e}'
+
+
+def write_summary(path, counts, failures, n_bytes, seconds):
+    lines = [f'{status}: {count}' for status, count in sorted(counts.items())]
+    lines.append(f'{sum(counts.values()) / seconds:.1f} images/s, '
+                 f'{n_bytes / seconds / 2**20:.1f} MB/s read '
+                 f'({seconds:.1f}s)')
+    lines.extend(f'{image}\t{error}' for image, error in failures)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines[:len(counts) + 1]))
 
 
 def main():
@@ -55,17 +91,40 @@ def main():
                             help='Target Resolution', type=int)
     arg_parser.add_argument('-n', '--n_process', default=8,
                             help='Number of core to use', type=int)
+    arg_parser.add_argument('-c', '--chunksize', default=16,
+                            help='Images per task (default=16)', type=int)
+    arg_parser.add_argument('-i', '--incremental', default=True,
+                            help='Skip outputs newer than their source ' +
+                            '(default=True)',
+                            type=lambda x: x.lower() in ('true', '1'))
     args = vars(arg_parser.parse_args())
 
     images = glob.glob(os.path.join(args['path'], '**/*.*g'), recursive=True)
     assert images, 'Image files not found.'
 
-    divided_list = list(split(images, args['n_process']))
-    inputs = [(i, divided, args) for i, divided in enumerate(divided_list)]
-    pool = multiprocessing.Pool(processes=args['n_process'])
-    pool.map(run, inputs)
-    pool.close()
-    pool.join()
+    counts = Counter()
+    failures = []
+    n_bytes = 0
+    start = time.perf_counter()
+    inputs = ((image, args) for image in images)
+    with multiprocessing.Pool(processes=args['n_process']) as pool:
+        # small tasks are handed out as workers free up, so a chunk of
+        # huge paintings does not stall the others
+        results = pool.imap_unordered(run, inputs,
+                                      chunksize=args['chunksize'])
+        pbar = tqdm.tqdm(results, total=len(images))
+        for image, status, error in pbar:
+            counts[status] += 1
+            if status == 'failed':
+                failures.append((image, error))
+            elif status != 'skipped':
+                n_bytes += os.path.getsize(image)
+            pbar.set_postfix(counts)
+    seconds = time.perf_counter() - start
+
+    os.makedirs(args['output_dir'], exist_ok=True)
+    write_summary(os.path.join(args['output_dir'], SUMMARY_FILE),
+                  counts, failures, n_bytes, seconds)
 
 
 if __name__ == '__main__':
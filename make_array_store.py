@@ -0,0 +1,81 @@
+"""
+Copyright (C) https://github.com/kynk94. All rights reserved.
+Licensed under the CC BY-NC-SA 4.0 license
+(https://creativecommons.org/licenses/by-nc-sa/4.0/).
+"""
+import os
+import argparse
+import tqdm
+import tensorflow as tf
+from tf_utils import ImageLoader, read_image, str_to_bool, write_store_meta
+from tf_utils.array_store import create_array_store
+
+
+def main():
+    arg_parse = argparse.ArgumentParser()
+    arg_parse.add_argument('-t', '--data_txt', type=str, required=True,
+                           help='Dataset txt file made by make_dataset_txt')
+    arg_parse.add_argument('-o', '--output_dir', type=str, default=None,
+                           help='Output directory ' +
+                           '(default=<data_txt dir>/memmap_<size>)')
+    arg_parse.add_argument('-s', '--size', type=int, required=True,
+                           help='Stored image resolution (input_size)')
+    arg_parse.add_argument('-c', '--channel', type=int, default=3,
+                           help='Image channel (default=3)')
+    arg_parse.add_argument('-l', '--use_label', type=str_to_bool,
+                           default=False,
+                           help='Store labels of txt file (default=False)')
+    arg_parse.add_argument('-b', '--batch_size', type=int, default=256,
+                           help='Images written per step (default=256)')
+    args = vars(arg_parse.parse_args())
+
+    if args['output_dir'] is None:
+        args['output_dir'] = os.path.join(os.path.dirname(args['data_txt']),
+                                          f"memmap_{args['size']}")
+
+    size = (args['size'],) * 2
+    loader = ImageLoader(data_txt_file=args['data_txt'],
+                         use_label=args['use_label'])
+    images, labels = create_array_store(args['output_dir'],
+                                        n_data=len(loader),
+                                        shape=(args['channel'], *size),
+                                        use_label=args['use_label'])
+
+    def map_func(path, label=None):
+        image = read_image(path, new_size=size, channel=args['channel'])
+        image = tf.transpose(image, (2, 0, 1))
+        if label is None:
+            return image
+        return image, label
+
+    dataset = loader.dataset.map(
+        map_func=map_func,
+        num_parallel_calls=tf.data.experimental.AUTOTUNE
+    ).batch(args['batch_size']).prefetch(tf.data.experimental.AUTOTUNE)
+
+    start = 0
+    pbar = tqdm.tqdm(dataset.as_numpy_iterator(), total=len(dataset))
+    for data in pbar:
+        if args['use_label']:
+            data, label = data
+            labels[start:start + len(data)] = label
+        images[start:start + len(data)] = data
+        start += len(data)
+    images.flush()
+    if labels is not None:
+        labels.flush()
+
+    write_store_meta(
+        args['output_dir'],
+        n_data=len(loader),
+        height=size[0],
+        width=size[1],
+        channel=args['channel'],
+        use_label=args['use_label'],
+        class_names=[loader.class_dict_pair[i]
+                     for i in range(loader.n_class)])
+    print(f"Wrote {len(loader)} images to {args['output_dir']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Copyright (C) https://github.com/kynk94. All rights reserved.
+Licensed under the CC BY-NC-SA 4.0 license
+(https://creativecommons.org/licenses/by-nc-sa/4.0/).
+"""
+import os
+import argparse
+import multiprocessing
+import numpy as np
+import tqdm
+from tf_utils.dedup import dhash_batch, find_duplicates
+from tf_utils.manifest import (MANIFEST_FIELDS, MANIFEST_SUFFIX,
+                               read_manifest, write_manifest)
+
+
+def run(paths):
+    return dhash_batch(paths)
+
+
+def main():
+    arg_parse = argparse.ArgumentParser()
+    arg_parse.add_argument('-m', '--manifest', type=str, required=True,
+                           help='Manifest made by make_manifest')
+    arg_parse.add_argument('-o', '--output', type=str, default=None,
+                           help='Output manifest ' +
+                           '(default=<manifest>.dedup.manifest.csv)')
+    arg_parse.add_argument('-d', '--max_distance', type=int, default=4,
+                           help='Max Hamming distance of 64-bit hashes ' +
+                           'counted as duplicate (default=4)')
+    arg_parse.add_argument('-b', '--batch_size', type=int, default=256,
+                           help='Images hashed per task (default=256)')
+    arg_parse.add_argument('-n', '--n_process', type=int,
+                           default=os.cpu_count(),
+                           help='Number of processes (default=cpu_count)')
+    args = vars(arg_parse.parse_args())
+
+    if args['output'] is None:
+        args['output'] = args['manifest'][:-len(MANIFEST_SUFFIX)] + \
+            '.dedup' + MANIFEST_SUFFIX
+
+    data_dir = os.path.dirname(args['manifest'])
+    rows = read_manifest(args['manifest'])
+    valid = [i for i, row in enumerate(rows) if row['valid']]
+    paths = [os.path.join(data_dir, rows[i]['path']) for i in valid]
+    assert paths, 'No valid images in manifest.'
+    batches = [paths[i:i + args['batch_size']]
+               for i in range(0, len(paths), args['batch_size'])]
+
+    with multiprocessing.Pool(processes=args['n_process']) as pool:
+        results = list(tqdm.tqdm(pool.imap(run, batches),
+                                 total=len(batches)))
+    hashes = np.concatenate([r[0] for r in results])
+    readable = np.concatenate([r[1] for r in results])
+
+    # unreadable files are dropped instead of all matching hash 0
+    duplicate_of = np.full(len(valid), -1, np.int64)
+    index = np.flatnonzero(readable)
+    found = find_duplicates(hashes[index], args['max_distance'])
+    duplicate_of[index] = np.where(found < 0, -1, index[found])
+
+    duplicates = []
+    for i, row_index in enumerate(valid):
+        if not readable[i] or duplicate_of[i] >= 0:
+            rows[row_index]['valid'] = 0
+        if duplicate_of[i] >= 0:
+            duplicates.append((rows[row_index]['path'],
+                               rows[valid[duplicate_of[i]]]['path']))
+
+    write_manifest(args['output'],
+                   [[row[f] for f in MANIFEST_FIELDS] for row in rows])
+    with open(args['output'] + '.duplicates.txt', 'w',
+              encoding='utf-8') as f:
+        f.writelines(f'{path},{kept}\n' for path, kept in duplicates)
+    print(f"Wrote {args['output']}: {len(duplicates)} near-duplicates, "
+          f'{int((~readable).sum())} unreadable of {len(valid)} images')
+
+
+if __name__ == '__main__':
+    main()
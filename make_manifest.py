@@ -0,0 +1,51 @@
+"""
+Copyright (C) https://github.com/kynk94. All rights reserved.
+Licensed under the CC BY-NC-SA 4.0 license
+(https://creativecommons.org/licenses/by-nc-sa/4.0/).
+"""
+import os
+import argparse
+import multiprocessing
+import tqdm
+from tf_utils.manifest import inspect_image, write_manifest, manifest_path
+
+
+def run(inputs):
+    path, label, data_dir = inputs
+    return (path, label, *inspect_image(os.path.join(data_dir, path)))
+
+
+def main():
+    arg_parse = argparse.ArgumentParser()
+    arg_parse.add_argument('-t', '--data_txt', type=str, required=True,
+                           help='Dataset txt file made by make_dataset_txt')
+    arg_parse.add_argument('-o', '--output', type=str, default=None,
+                           help='Output manifest ' +
+                           '(default=<data_txt>.manifest.csv)')
+    arg_parse.add_argument('-n', '--n_process', type=int,
+                           default=os.cpu_count(),
+                           help='Number of processes (default=cpu_count)')
+    args = vars(arg_parse.parse_args())
+
+    if args['output'] is None:
+        args['output'] = manifest_path(args['data_txt'])
+
+    data_dir = os.path.dirname(args['data_txt'])
+    with open(args['data_txt'], 'r', encoding='utf-8') as txt_file:
+        inputs = []
+        for line in txt_file.readlines():
+            path, _, label = line.strip().partition(',')
+            inputs.append((path, label, data_dir))
+
+    with multiprocessing.Pool(processes=args['n_process']) as pool:
+        rows = list(tqdm.tqdm(pool.imap(run, inputs, chunksize=256),
+                              total=len(inputs)))
+
+    write_manifest(args['output'], rows)
+    n_invalid = sum(not row[-1] for row in rows)
+    print(f"Wrote {len(rows)} entries to {args['output']} "
+          f'({n_invalid} invalid)')
+
+
+if __name__ == '__main__':
+    main()
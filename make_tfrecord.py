@@ -0,0 +1,82 @@
+"""
+Copyright (C) https://github.com/kynk94. All rights reserved.
+Licensed under the CC BY-NC-SA 4.0 license
+(https://creativecommons.org/licenses/by-nc-sa/4.0/).
+"""
+import os
+import argparse
+import tqdm
+import tensorflow as tf
+from tf_utils import ImageLoader, read_image, str_to_bool, write_store_meta
+from tf_utils.tfrecord import serialize_example, get_shard_paths
+
+
+def main():
+    arg_parse = argparse.ArgumentParser()
+    arg_parse.add_argument('-t', '--data_txt', type=str, required=True,
+                           help='Dataset txt file made by make_dataset_txt')
+    arg_parse.add_argument('-o', '--output_dir', type=str, default=None,
+                           help='Output directory ' +
+                           '(default=<data_txt dir>/tfrecord_<size>)')
+    arg_parse.add_argument('-s', '--size', type=int, required=True,
+                           help='Stored image resolution (input_size)')
+    arg_parse.add_argument('-n', '--n_shard', type=int, default=16,
+                           help='Number of TFRecord shards (default=16)')
+    arg_parse.add_argument('-c', '--channel', type=int, default=3,
+                           help='Image channel (default=3)')
+    arg_parse.add_argument('-l', '--use_label', type=str_to_bool,
+                           default=False,
+                           help='Store labels of txt file (default=False)')
+    args = vars(arg_parse.parse_args())
+
+    if args['output_dir'] is None:
+        args['output_dir'] = os.path.join(os.path.dirname(args['data_txt']),
+                                          f"tfrecord_{args['size']}")
+    os.makedirs(args['output_dir'], exist_ok=True)
+
+    size = (args['size'],) * 2
+    loader = ImageLoader(data_txt_file=args['data_txt'],
+                         use_label=args['use_label'])
+
+    def map_func(path, label=None):
+        image = read_image(path, new_size=size, channel=args['channel'])
+        if label is None:
+            return image
+        return image, label
+
+    dataset = loader.dataset.map(
+        map_func=map_func,
+        num_parallel_calls=tf.data.experimental.AUTOTUNE
+    ).prefetch(tf.data.experimental.AUTOTUNE)
+
+    # Round-robin over shards, so every shard is a sample of the whole
+    # (label-sorted) txt file.
+    shard_paths = get_shard_paths(args['output_dir'], args['n_shard'])
+    writers = [tf.io.TFRecordWriter(path) for path in shard_paths]
+    try:
+        pbar = tqdm.tqdm(dataset.as_numpy_iterator(), total=len(loader))
+        for i, data in enumerate(pbar):
+            if args['use_label']:
+                example = serialize_example(*data)
+            else:
+                example = serialize_example(data)
+            writers[i % args['n_shard']].write(example)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    write_store_meta(
+        args['output_dir'],
+        n_data=len(loader),
+        height=size[0],
+        width=size[1],
+        channel=args['channel'],
+        n_shard=args['n_shard'],
+        use_label=args['use_label'],
+        class_names=[loader.class_dict_pair[i]
+                     for i in range(loader.n_class)])
+    print(f"Wrote {len(loader)} images to {args['output_dir']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+from tf_layers import BaseModel  # noqa: E402
+
+
+class StepModel(BaseModel):
+    def __init__(self, conf, strategy=None):
+        super().__init__(conf, strategy=strategy)
+        self.set_checkpoint()
+
+    @BaseModel.strategy_run
+    def train_step(self, inputs):
+        return {'loss': tf.reduce_mean(inputs)}
+
+
+@pytest.mark.parametrize('use_strategy, jit_compile', [
+    (False, None),
+    (True, None),
+    (True, 'train'),
+])
+def test_strategy_run(tmp_path, use_strategy, jit_compile):
+    strategy = None
+    if use_strategy:
+        strategy = tf.distribute.OneDeviceStrategy('/cpu:0')
+    model = StepModel({'checkpoint_dir': str(tmp_path),
+                       'jit_compile': jit_compile}, strategy)
+    log_dict = model.train_step(tf.constant([1., 2., 3.]))
+    assert float(log_dict['loss']) == pytest.approx(2.)
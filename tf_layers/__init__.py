@@ -11,6 +11,7 @@ from tensorflow.keras.layers import Attention, AdditiveAttention
 from tensorflow.keras.layers.experimental import SyncBatchNormalization
 from tensorflow_addons.layers import Maxout
 from .activations import Activation
+from .augment import diff_augment
 from .conv import Conv1D, Conv2D, Conv3D
 from .conv import TransposeConv1D, TransposeConv2D, TransposeConv3D
 from .conv import DecompTransConv2D, DecompTransConv3D
@@ -37,6 +38,7 @@ from .residual_blocks import ResIdentityBlock2D
 from .wavelet import HaarTransform2D, HaarInverseTransform2D
 
 from .base_model import BaseModel
+from .trainer import Trainer
 
 from .utils import check_tf_version
 version = check_tf_version()
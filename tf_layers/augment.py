@@ -0,0 +1,110 @@
+"""
+Copyright (C) https://github.com/kynk94. All rights reserved.
+Licensed under the CC BY-NC-SA 4.0 license
+(https://creativecommons.org/licenses/by-nc-sa/4.0/).
+"""
+import tensorflow as tf
+
+# Differentiable augmentations of DiffAugment (Zhao et al., 2020).
+# Every op draws one random value per image and runs on the whole
+# NHWC batch at once, so it can be used inside compiled train steps.
+
+
+def _uniform(x, minval=0.0, maxval=1.0):
+    shape = tf.stack([tf.shape(x)[0], 1, 1, 1])
+    return tf.random.uniform(shape, minval, maxval, dtype=x.dtype)
+
+
+def rand_flip(x):
+    return tf.where(_uniform(x) < 0.5, tf.reverse(x, axis=[2]), x)
+
+
+def rand_brightness(x):
+    return x + _uniform(x, minval=-0.5, maxval=0.5)
+
+
+def rand_saturation(x):
+    mean = tf.reduce_mean(x, axis=3, keepdims=True)
+    return (x - mean) * _uniform(x, maxval=2.0) + mean
+
+
+def rand_contrast(x):
+    mean = tf.reduce_mean(x, axis=(1, 2, 3), keepdims=True)
+    return (x - mean) * _uniform(x, minval=0.5, maxval=1.5) + mean
+
+
+def _shift_index(size, shift):
+    """
+    Per image source index of every row (or column) shifted by `shift`,
+    and whether it is inside the image.
+    """
+    index = tf.range(size)[tf.newaxis] - shift
+    inside = tf.logical_and(index >= 0, index < size)
+    return tf.clip_by_value(index, 0, size - 1), inside
+
+
+def rand_translation(x, ratio=0.125):
+    """
+    Shift each image by up to `ratio` of its size, padding with zeros.
+    """
+    batch, height, width = tf.unstack(tf.shape(x)[:3])
+    max_h = tf.cast(tf.cast(height, tf.float32) * ratio + 0.5, tf.int32)
+    max_w = tf.cast(tf.cast(width, tf.float32) * ratio + 0.5, tf.int32)
+    shift_h = tf.random.uniform((batch, 1), -max_h, max_h + 1, tf.int32)
+    shift_w = tf.random.uniform((batch, 1), -max_w, max_w + 1, tf.int32)
+    rows, inside_h = _shift_index(height, shift_h)
+    cols, inside_w = _shift_index(width, shift_w)
+    x = tf.gather(x, rows, axis=1, batch_dims=1)
+    x = tf.gather(x, cols, axis=2, batch_dims=1)
+    mask = tf.logical_and(inside_h[:, :, tf.newaxis],
+                          inside_w[:, tf.newaxis, :])
+    return x * tf.cast(mask, x.dtype)[..., tf.newaxis]
+
+
+def rand_cutout(x, ratio=0.5):
+    """
+    Zero out one window of `ratio` of the size at a random center.
+    """
+    batch, height, width = tf.unstack(tf.shape(x)[:3])
+    size_h = tf.cast(tf.cast(height, tf.float32) * ratio + 0.5, tf.int32)
+    size_w = tf.cast(tf.cast(width, tf.float32) * ratio + 0.5, tf.int32)
+    top = tf.random.uniform((batch, 1), 0, height, tf.int32) - size_h // 2
+    left = tf.random.uniform((batch, 1), 0, width, tf.int32) - size_w // 2
+    rows = tf.range(height)[tf.newaxis]
+    cols = tf.range(width)[tf.newaxis]
+    inside_h = tf.logical_and(rows >= top, rows < top + size_h)
+    inside_w = tf.logical_and(cols >= left, cols < left + size_w)
+    mask = tf.logical_and(inside_h[:, :, tf.newaxis],
+                          inside_w[:, tf.newaxis, :])
+    return x * (1 - tf.cast(mask, x.dtype))[..., tf.newaxis]
+
+
+AUGMENT_FUNCTIONS = {
+    'flip': (rand_flip,),
+    'color': (rand_brightness, rand_saturation, rand_contrast),
+    'translation': (rand_translation,),
+    'cutout': (rand_cutout,),
+}
+
+
+def diff_augment(x, policy='color,translation,cutout', data_format=None):
+    """
+    Apply the comma separated `policy` to a batch of images.
+    The same function should be applied to real and fake images
+    before every discriminator call.
+    """
+    if not policy:
+        return x
+    if data_format is None:
+        data_format = tf.keras.backend.image_data_format()
+    if data_format == 'channels_first':
+        x = tf.transpose(x, (0, 2, 3, 1))
+    for name in policy.split(','):
+        name = name.strip()
+        if name not in AUGMENT_FUNCTIONS:
+            raise ValueError(f'Unsupported augmentation: {name}')
+        for func in AUGMENT_FUNCTIONS[name]:
+            x = func(x)
+    if data_format == 'channels_first':
+        x = tf.transpose(x, (0, 3, 1, 2))
+    return x
@@ -1,10 +1,21 @@
 import os
 import shutil
+import weakref
+import threading
 from abc import ABC
 from datetime import datetime
 
 import tensorflow as tf
 
+from .augment import diff_augment
+from .utils import check_tf_version, set_xla_compatible
+
+# functions compiled for each `jit_compile` group
+JIT_FUNCTIONS = {
+    'train': ('train', 'train_cycle'),
+    'test': ('generate_image',)
+}
+
 
 class BaseModel(ABC):
     def __init__(self, conf, ckpt=None, strategy=None):
@@ -16,9 +27,26 @@ class BaseModel(ABC):
         self._checkpoint_dir = None
         self._output_dir = None
         self._strategy = strategy
+        self._augment_policy = conf.get('diff_augment')
+        self._precision = conf.get('mixed_precision')
+        if self._precision:
+            # before any layer is built
+            self._set_precision_policy(self._precision)
 
         self._set_dirs(self.load(ckpt))
-        self._logger = tf.summary.create_file_writer(self._checkpoint_dir)
+        self._summary_step = conf.get('summary_step') or 1
+        self._summary_secs = conf.get('summary_secs')
+        self._summaries = dict()
+        self._jit_functions = dict()
+        self._defer_scalar_log = False
+        self._set_jit_compile(conf.get('jit_compile'))
+        # events are flushed by a background thread, a write step only
+        # flushes when `summary_queue` events are pending
+        self._logger = tf.summary.create_file_writer(
+            self._checkpoint_dir,
+            max_queue=conf.get('summary_queue', 100),
+            flush_millis=10**9)
+        self._start_flusher(conf.get('summary_flush_secs', 10))
 
     def strategy(func):
         def decorator(*args, **kwargs):
@@ -34,7 +62,15 @@ class BaseModel(ABC):
             self = args[0]
             if self._strategy is None:
                 return func(*args, **kwargs)
-            output = self._strategy.run(func, args, kwargs)
+            replica_fn = func
+            if 'train' in self.jit_compile:
+                # XLA compiles the replica function, not strategy.run
+                functions = self._jit_functions.setdefault('train', {})
+                if func.__name__ not in functions:
+                    functions[func.__name__] = tf.function(
+                        func, **self._jit_kwargs())
+                replica_fn = functions[func.__name__]
+            output = self._strategy.run(replica_fn, args, kwargs)
             if not isinstance(output, dict):
                 return output
             log_dict = {
@@ -45,6 +81,69 @@ class BaseModel(ABC):
             return log_dict
         return decorator
 
+    @staticmethod
+    def _jit_kwargs():
+        if check_tf_version()[1] >= 5:
+            return {'jit_compile': True}
+        return {'experimental_compile': True}
+
+    def _set_jit_compile(self, jit_compile):
+        """
+        jit_compile: groups of JIT_FUNCTIONS to compile with XLA,
+                     e.g. 'train,test'.
+        The tf.functions of the groups are replaced by XLA compiled
+        ones on this instance. Compiled train steps only accumulate
+        scalars, `write_pending_scalar_log` writes them.
+        """
+        if isinstance(jit_compile, str):
+            jit_compile = jit_compile.split(',')
+        self.jit_compile = {group.strip() for group in jit_compile or ()}
+        unknown = self.jit_compile - set(JIT_FUNCTIONS)
+        if unknown:
+            raise ValueError(f'Unsupported `jit_compile`: {unknown}')
+        # layers built from now on avoid ops without XLA kernels, only
+        # when train steps are compiled, so the model is trained with
+        # the ops it runs. Compiled tests alone fall back if needed.
+        set_xla_compatible('train' in self.jit_compile)
+
+        for group in self.jit_compile:
+            functions = self._jit_functions.setdefault(group, {})
+            if group == 'train' and self._strategy is not None:
+                continue
+            for name in JIT_FUNCTIONS[group]:
+                function = getattr(type(self), name, None)
+                if not hasattr(function, 'python_function'):
+                    continue
+                functions[name] = tf.function(
+                    function.python_function.__get__(self),
+                    **self._jit_kwargs())
+                setattr(self, name, functions[name])
+                if group == 'train':
+                    self._defer_scalar_log = True
+
+    def disable_jit_compile(self, groups=None):
+        """
+        Back to the uncompiled tf.functions of `groups` (default all),
+        e.g. after XLA failed to compile them.
+        """
+        groups = set(self.jit_compile if groups is None else groups)
+        for group in groups & self.jit_compile:
+            for name in self._jit_functions.pop(group, {}):
+                self.__dict__.pop(name, None)
+        self.jit_compile -= groups
+        if 'train' in groups:
+            self.write_pending_scalar_log()
+            self._defer_scalar_log = False
+
+    def jit_tracing_counts(self):
+        """
+        Traces of each XLA compiled function, every trace of
+        a new input signature is a compile (cache miss).
+        """
+        return {name: function.experimental_get_tracing_count()
+                for functions in self._jit_functions.values()
+                for name, function in functions.items()}
+
     def _set_dirs(self, time_stamp=None):
         if time_stamp is None:
             now = datetime.now().strftime('%y-%m-%d_%H_%M_%S')
@@ -62,6 +161,74 @@ class BaseModel(ABC):
         if self.ckpt_file is not None:
             self.ckpt.restore(self.ckpt_file)
 
+    @staticmethod
+    def _set_precision_policy(policy):
+        """
+        policy: 'mixed_float16' or 'mixed_bfloat16'.
+        """
+        if check_tf_version()[1] >= 4:
+            tf.keras.mixed_precision.set_global_policy(policy)
+        else:
+            tf.keras.mixed_precision.experimental.set_policy(policy)
+
+    def optimizer(self, optimizer):
+        """
+        `optimizer` with dynamic loss scaling under 'mixed_float16'.
+        bfloat16 has the float32 exponent range and needs no scaling.
+        """
+        if self._precision != 'mixed_float16':
+            return optimizer
+        if check_tf_version()[1] >= 4:
+            return tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+        return tf.keras.mixed_precision.experimental.LossScaleOptimizer(
+            optimizer, 'dynamic')
+
+    def loss_scale(self, optimizer):
+        """
+        Current loss scale of `optimizer` as float32, 1 without scaling.
+        """
+        loss_scale = getattr(optimizer, 'loss_scale', None)
+        if loss_scale is None:
+            return tf.constant(1.)
+        if callable(loss_scale):
+            loss_scale = loss_scale()
+        return tf.cast(loss_scale, tf.float32)
+
+    def apply_gradients(self, optimizer, tape, loss, variables):
+        """
+        Apply the gradients of `loss` recorded by `tape` to `variables`.
+        With loss scaling, backpropagation starts from the loss scale
+        and the gradients are unscaled, steps with non-finite
+        gradients are skipped by the optimizer.
+        """
+        if not hasattr(optimizer, 'get_unscaled_gradients'):
+            gradients = tape.gradient(loss, variables)
+        else:
+            loss_scale = tf.cast(self.loss_scale(optimizer), loss.dtype)
+            gradients = tape.gradient(
+                loss, variables,
+                output_gradients=tf.ones_like(loss) * loss_scale)
+            gradients = optimizer.get_unscaled_gradients(gradients)
+        optimizer.apply_gradients(zip(gradients, variables))
+
+    def augment(self, x):
+        """
+        DiffAugment of discriminator inputs, identity without
+        `diff_augment` in conf. Flattened inputs are augmented as images
+        of `input_size` and `channel`.
+        """
+        if not self._augment_policy:
+            return x
+        if len(x.shape) != 2:
+            return diff_augment(x, self._augment_policy)
+        size = self.conf['input_size']
+        if tf.keras.backend.image_data_format() == 'channels_first':
+            shape = (-1, self.conf['channel'], size, size)
+        else:
+            shape = (-1, size, size, self.conf['channel'])
+        x = diff_augment(tf.reshape(x, shape), self._augment_policy)
+        return tf.reshape(x, (-1, size * size * self.conf['channel']))
+
     def image_write(self, filename, data, denorm=True):
         data = tf.clip_by_value(data, -1, 1)
         if denorm:
@@ -75,6 +242,7 @@ class BaseModel(ABC):
 
     def save(self):
         self.ckpt_manager.save(checkpoint_number=self.ckpt.step)
+        self._logger.flush()
 
     def load(self, checkpoint_path):
         if checkpoint_path is None:
@@ -92,11 +260,79 @@ class BaseModel(ABC):
         self.ckpt_file = ckpt
         return os.path.basename(os.path.dirname(ckpt))
 
+    def _start_flusher(self, interval):
+        # the thread holds the writer, not the model, so a dropped
+        # model is collected and its finalizer stops the thread
+        logger = self._logger
+        stop = self._flush_stop = threading.Event()
+
+        def flush():
+            while not stop.wait(interval):
+                logger.flush()
+
+        threading.Thread(target=flush, daemon=True).start()
+        weakref.finalize(self, stop.set)
+
+    def close(self):
+        """
+        Stop the background flusher and write pending summaries.
+        """
+        self._flush_stop.set()
+        self.write_pending_scalar_log()
+        self._logger.flush()
+
+    def _summary_accumulator(self, name):
+        """
+        (sum, count, last write step or time) of the scalar `name`,
+        created on first use.
+        """
+        if name not in self._summaries:
+            with tf.init_scope():
+                self._summaries[name] = tf.Variable(
+                    [0., 0., -1.], dtype=tf.float64, trainable=False)
+        return self._summaries[name]
+
     def write_scalar_log(self, **kwargs):
+        """
+        Scalars are written as the mean over the steps since their last
+        write, every `summary_step` steps, or every `summary_secs`
+        seconds when set.
+        """
+        for name, data in kwargs.items():
+            self._summary_accumulator(name).assign_add(
+                tf.stack([tf.cast(data, tf.float64), 1., 0.]))
+        if not self._defer_scalar_log:
+            self._write_scalar_summaries(kwargs)
+
+    def write_pending_scalar_log(self):
+        """
+        Write the scalars accumulated by XLA compiled train steps,
+        which have no summary ops.
+        """
+        if self._defer_scalar_log:
+            self._write_scalar_summaries(list(self._summaries))
+
+    def _write_scalar_summaries(self, names):
         step = self.ckpt.step
+        now = tf.timestamp()
         with self._logger.as_default():
-            for name, data in kwargs.items():
-                tf.summary.scalar(name=name, data=data, step=step)
+            for name in names:
+                accumulator = self._summaries[name]
+                total, count, last = tf.unstack(accumulator.read_value())
+                if self._summary_secs:
+                    record = now - last >= self._summary_secs
+                    mark = now
+                else:
+                    mark = tf.cast(step, tf.float64)
+                    record = mark // self._summary_step > \
+                        last // self._summary_step
+                record = tf.logical_and(record, count > 0)
+                with tf.summary.record_if(record):
+                    tf.summary.scalar(name=name,
+                                      data=total / tf.maximum(count, 1.),
+                                      step=step)
+                accumulator.assign(tf.where(
+                    record, tf.stack([0., 0., mark]), accumulator))
 
     def write_image_log(self, step, data, name='outputs', denorm=True):
         if len(data.shape) == 3:
@@ -189,7 +189,8 @@ class Conv(convolutional.Conv):
         # kernel.shape: (kernel_size, kernel_size, channels//groups, filters)
         if self.use_weight_scaling:
             fan_in = np.prod(self.kernel.shape[:-1])
-            self.runtime_coef = self.gain / np.sqrt(fan_in)
+            # python float, so the product keeps the (float16) kernel dtype
+            self.runtime_coef = float(self.gain / np.sqrt(fan_in))
             self.runtime_coef *= self.lr_multiplier
 
     def _fir_factor_from_stride(self, stride):
@@ -764,7 +765,8 @@ class DecompTransConv(Conv):
             for kernel_shape in kernel_shapes:
                 fan_in = np.prod(kernel_shape[:-1])
                 runtime_coef = self.gain / np.sqrt(fan_in)
-                self.runtime_coefs.append(runtime_coef * self.lr_multiplier)
+                runtime_coef *= self.lr_multiplier
+                self.runtime_coefs.append(float(runtime_coef))
         self.built = True
 
     def call(self, inputs):
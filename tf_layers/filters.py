@@ -3,6 +3,7 @@ import numpy as np
 import tensorflow as tf
 from tensorflow.python.keras.utils import conv_utils
 from tensorflow.python.keras.utils.conv_utils import normalize_tuple
+from .utils import is_xla_compatible
 
 
 class FIRFilter(tf.keras.layers.Layer):
@@ -23,6 +24,7 @@ class FIRFilter(tf.keras.layers.Layer):
         self.kernel_normalize = kernel_normalize
         self.padding = padding
         self.data_format = conv_utils.normalize_data_format(data_format)
+        self._xla_compatible = is_xla_compatible()
 
     def build(self, input_shape):
         self.rank = len(input_shape) - 2
@@ -33,11 +35,12 @@ class FIRFilter(tf.keras.layers.Layer):
         kernel = self.kernel.reshape(kernel_shape)
         flipped_kernel = flipped_kernel.reshape(kernel_shape)
 
+        # constants in the compute dtype, float16 under mixed precision
         kernel = tf.constant(kernel,
-                             dtype=self.dtype,
+                             dtype=self._compute_dtype_object,
                              name='kernel')
         flipped_kernel = tf.constant(flipped_kernel,
-                                     dtype=self.dtype,
+                                     dtype=self._compute_dtype_object,
                                      name='flipped_kernel')
 
         self._channel_axis = self._get_channel_axis()
@@ -156,8 +159,14 @@ class FIRFilter(tf.keras.layers.Layer):
             filters=flipped_kernel,
             name='fir_backward')
 
-    @tf.custom_gradient
     def call(self, inputs):
+        # XLA differentiates the padded convolution itself
+        if self._xla_compatible:
+            return self._conv_op(inputs)
+        return self._fir(inputs)
+
+    @tf.custom_gradient
+    def _fir(self, inputs):
         outputs = self._conv_op(inputs)
 
         @tf.custom_gradient
@@ -60,7 +60,7 @@ class Linear(K_layers.Dense):
         if self.use_weight_scaling:
             input_shape = tf.TensorShape(input_shape)
             fan_in = np.prod(input_shape[1:])
-            self.runtime_coef = self.gain / np.sqrt(fan_in)
+            self.runtime_coef = float(self.gain / np.sqrt(fan_in))
             self.runtime_coef *= self.lr_multiplier
 
     def call(self, inputs):
@@ -80,7 +80,7 @@ class GaussianNoise(NoiseBase):
             noise = tf.random.normal(shape=shape,
                                      mean=0.0,
                                      stddev=self.stddev,
-                                     dtype=self.dtype)
+                                     dtype=inputs.dtype)
             return inputs + noise * self.strength
         self._noise_op = noise_op
 
@@ -117,7 +117,7 @@ class UniformNoise(NoiseBase):
             noise = tf.random.uniform(shape=shape,
                                       minval=self.minval,
                                       maxval=self.maxval,
-                                      dtype=self.dtype)
+                                      dtype=inputs.dtype)
             return inputs + noise * self.strength
         self._noise_op = noise_op
 
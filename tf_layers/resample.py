@@ -4,9 +4,14 @@ Licensed under the CC BY-NC-SA 4.0 license
 (https://creativecommons.org/licenses/by-nc-sa/4.0/).
 """
 import functools
+import warnings
 import tensorflow as tf
 from tensorflow.python.keras import layers as K_layers
 from tensorflow.python.keras.utils import conv_utils
+from .utils import is_xla_compatible
+
+# tf.image.resize methods with XLA kernels, without antialias
+XLA_RESIZE_METHODS = {'bilinear', 'nearest'}
 
 
 class Resample(K_layers.Layer):
@@ -30,6 +35,7 @@ class Resample(K_layers.Layer):
         self.antialias = antialias
         self.mode = self._check_mode(mode)
         self.data_format = conv_utils.normalize_data_format(data_format)
+        self._xla_compatible = is_xla_compatible()
 
     def build(self, input_shape):
         input_shape = tf.TensorShape(input_shape)
@@ -53,6 +59,17 @@ class Resample(K_layers.Layer):
         return self._resize_op(inputs)
 
     def _get_resize_op(self):
+        method = self.method
+        antialias = self.antialias
+        if self._xla_compatible and (method not in XLA_RESIZE_METHODS or
+                                     antialias):
+            warnings.warn(f'{self.name}: XLA has no `{method}` resize '
+                          f'(antialias={antialias}), using bilinear '
+                          'without antialias while train steps are '
+                          'compiled.')
+            method = 'bilinear'
+            antialias = False
+
         # tf.image.resize only supports data format `channels_last`
         if self.rank == 1:
             def _resize_op(inputs):
@@ -60,18 +77,18 @@ class Resample(K_layers.Layer):
                 outputs = tf.image.resize(
                     outputs,
                     size=self.size + (1,),
-                    method=self.method,
+                    method=method,
                     preserve_aspect_ratio=self.preserve_aspect_ratio,
-                    antialias=self.antialias,
+                    antialias=antialias,
                     name='resize')
                 return tf.squeeze(outputs, axis=2)
         elif self.rank == 2:
             _resize_op = functools.partial(
                 tf.image.resize,
                 size=self.size,
-                method=self.method,
+                method=method,
                 preserve_aspect_ratio=self.preserve_aspect_ratio,
-                antialias=self.antialias,
+                antialias=antialias,
                 name='resize')
         else:
             raise NotImplementedError(
@@ -0,0 +1,233 @@
+import re
+import time
+import tqdm
+import tensorflow as tf
+
+# errors that mean XLA could not compile a function, not input errors
+XLA_ERRORS = (tf.errors.InvalidArgumentError, tf.errors.UnimplementedError)
+XLA_ERROR_PATTERN = re.compile(r'XLA|compil', re.IGNORECASE)
+
+
+class Trainer:
+    """
+    Train loop shared by the train_*.py scripts.
+    Up to `steps_per_execution` calls of `model.train` run in one
+    tf.function with an in-graph loop over the dataset iterator,
+    so Python only runs at test, save and end boundaries.
+    Logged values are running means kept on device and fetched one
+    call late, so the loop never waits for the step it just launched.
+    With the model's `jit_compile`, compile time, compile cache hits
+    and fallbacks to uncompiled steps are reported at the end.
+    """
+    def __init__(self,
+                 model,
+                 dataset=None,
+                 end_step=None,
+                 steps_per_execution=1,
+                 test_step=None,
+                 save_step=None,
+                 test_func=None,
+                 postfix=None,
+                 loader=None,
+                 steps_per_epoch=None,
+                 log_step=10):
+        """
+        model: BaseModel, `model.train(inputs)` runs one step
+               and increments `ckpt.step`. Models with
+               `train_cycle(batches)` are called with `n_critic`
+               batches at once instead.
+        dataset: endless (repeated) dataset or distributed dataset,
+                 None when `model.train()` takes no inputs.
+        test_func: called with the current step every `test_step`.
+        postfix: {progress bar name: key of the train log dict}.
+        loader: ImageLoader of `dataset`, adapts echoing
+                to the measured input wait.
+        log_step: steps between fetches of the running means.
+        """
+        self.model = model
+        self.dataset = dataset
+        self.end_step = end_step
+        self.steps_per_execution = max(int(steps_per_execution or 1), 1)
+        self.test_step = test_step
+        self.save_step = save_step
+        self.test_func = test_func
+        self.postfix = postfix or {}
+        self.loader = loader
+        self.steps_per_epoch = steps_per_epoch
+        self._use_cycle = hasattr(model, 'train_cycle')
+        self._cycle = model.n_critic if self._use_cycle else 1
+        self._train_steps = tf.function(self._run_steps)
+        self._jit = ','.join(sorted(model.jit_compile)) or 'off'
+        self._stats = {'calls': 0, 'compiles': 0, 'compile_time': 0.,
+                       'fallbacks': 0}
+        self.log_step = log_step
+        self._metrics = {key: tf.Variable(0., trainable=False)
+                         for key in self.postfix.values()}
+        self._count = tf.Variable(0., trainable=False)
+        self._wait = tf.Variable(0., dtype=tf.float64, trainable=False)
+        self._last_fetch = None
+        self._steady_start = None
+
+    def _train_step(self, iterator):
+        if iterator is None:
+            log_dict = self.model.train()
+        else:
+            start = tf.timestamp()
+            with tf.control_dependencies([start]):
+                inputs = [next(iterator) for _ in range(self._cycle)]
+            components = tf.nest.flatten(inputs, expand_composites=True)
+            with tf.control_dependencies(components):
+                self._wait.assign_add(tf.timestamp() - start)
+            if self._use_cycle:
+                log_dict = self.model.train_cycle(inputs)
+            else:
+                log_dict = self.model.train(inputs[0])
+        for key, metric in self._metrics.items():
+            metric.assign_add(tf.cast(log_dict[key], tf.float32))
+        self._count.assign_add(1.)
+
+    def _run_steps(self, iterator, n_call):
+        for _ in tf.range(n_call):
+            self._train_step(iterator)
+
+    def _fall_back(self, error, jit_group, compiled=True):
+        """
+        Run the functions of `jit_group` uncompiled after XLA failed
+        to compile them. Any other error is raised.
+        compiled: whether the failed call could have compiled.
+        """
+        if not compiled or jit_group not in self.model.jit_compile or \
+                not XLA_ERROR_PATTERN.search(error.message):
+            raise error
+        tqdm.tqdm.write(f'XLA compilation of {jit_group} failed, running '
+                        'it uncompiled: ' + error.message.splitlines()[0])
+        self._stats['fallbacks'] += 1
+        self.model.disable_jit_compile([jit_group])
+        if jit_group == 'train':
+            # retrace with the uncompiled model functions
+            self._train_steps = tf.function(self._run_steps)
+
+    def _call_train_steps(self, iterator, n_call):
+        traces = self._train_steps.experimental_get_tracing_count()
+        start = time.perf_counter()
+        try:
+            self._train_steps(iterator, tf.constant(n_call, tf.int64))
+        except XLA_ERRORS as e:
+            # XLA compiles when a new trace is first run, so the batches
+            # taken by this call are skipped and the step is retried
+            traced = self._train_steps.experimental_get_tracing_count()
+            self._fall_back(e, 'train', traced > traces)
+            return self._call_train_steps(iterator, n_call)
+        self._stats['calls'] += 1
+        if self._train_steps.experimental_get_tracing_count() > traces:
+            self._stats['compiles'] += 1
+            self._stats['compile_time'] += time.perf_counter() - start
+            self._steady_start = None
+        self.model.write_pending_scalar_log()
+
+    def _call_test(self, step):
+        try:
+            self.test_func(step)
+        except XLA_ERRORS as e:
+            self._fall_back(e, 'test')
+            self.test_func(step)
+
+    def compile_report(self, steady_steps, steady_time):
+        stats = self._stats
+        lines = [
+            f'XLA jit_compile: {self._jit}',
+            f"train calls compiling: {stats['compiles']} "
+            f"({stats['compile_time']:.1f}s with tracing)",
+            f"compile cache hits: {stats['calls'] - stats['compiles']} "
+            f"of {stats['calls']} train calls",
+            f"fallbacks to uncompiled: {stats['fallbacks']}",
+            f'steady state: {steady_steps / max(steady_time, 1e-9):.2f} '
+            'steps/s'
+        ]
+        lines.extend(f'{name} traces: {count}' for name, count
+                     in self.model.jit_tracing_counts().items())
+        return '\n'.join(lines)
+
+    def _snapshot(self):
+        """
+        Running means and input wait since the last snapshot
+        as device tensors, then reset. Nothing is copied to host.
+        """
+        count = tf.maximum(self._count.read_value(), 1.)
+        means = {name: self._metrics[key] / count
+                 for name, key in self.postfix.items()}
+        wait = self._wait.read_value()
+        for variable in (*self._metrics.values(), self._count, self._wait):
+            variable.assign(tf.zeros_like(variable))
+        now = time.perf_counter()
+        elapsed = now - self._last_fetch
+        self._last_fetch = now
+        return means, wait, elapsed
+
+    def _next_boundary(self, step):
+        boundary = self.end_step
+        for interval in (self.steps_per_execution,
+                         self.test_step, self.save_step):
+            if interval:
+                boundary = min(boundary, (step // interval + 1) * interval)
+        return boundary
+
+    @staticmethod
+    def _crossed(interval, prev_step, step):
+        return interval and step // interval > prev_step // interval
+
+    def _show(self, pbar, step, means, wait, elapsed):
+        pbar_dict = dict()
+        if self.steps_per_epoch:
+            pbar_dict['Epoch'] = step // self.steps_per_epoch + 1
+        pbar_dict['Step'] = step
+        for name, mean in means.items():
+            pbar_dict[name] = '{:.4f}'.format(mean.numpy())
+        if self.loader is not None:
+            if self.loader.echo_max is not None:
+                self.loader.adapt_echo(wait.numpy() / elapsed)
+            pbar_dict.update(self.loader.echo_stats())
+        pbar.set_postfix(pbar_dict)
+
+    def run(self):
+        # host mirror of ckpt.step, every train call adds one
+        step = int(self.model.ckpt.step.numpy())
+        iterator = None if self.dataset is None else iter(self.dataset)
+        pbar = tqdm.tqdm(initial=step, total=self.end_step,
+                         position=0, leave=True)
+        self._last_fetch = time.perf_counter()
+        last_log = step
+        pending = None
+        # throughput after the last compiling call
+        self._steady_start = None
+        steady_steps = 0
+        while step < self.end_step:
+            # whole cycles, a boundary inside a cycle is handled after it
+            n_call = -(-(self._next_boundary(step) - step) // self._cycle)
+            self._call_train_steps(iterator, n_call)
+            prev_step, step = step, step + n_call * self._cycle
+            pbar.update(step - prev_step)
+            if self._steady_start is None:
+                self._steady_start = time.perf_counter()
+                steady_steps = 0
+            else:
+                steady_steps += step - prev_step
+
+            # the previous snapshot is ready while this call runs
+            if pending is not None:
+                self._show(pbar, *pending)
+                pending = None
+            if step - last_log >= self.log_step:
+                pending = (step, *self._snapshot())
+                last_log = step
+            if self._crossed(self.test_step, prev_step, step):
+                self._call_test(step)
+            if self._crossed(self.save_step, prev_step, step):
+                self.model.save()
+        if pending is not None:
+            self._show(pbar, *pending)
+        pbar.close()
+        self.model.close()
+        if self._jit != 'off':
+            steady_time = time.perf_counter() - (self._steady_start or 0.)
+            tqdm.tqdm.write(self.compile_report(steady_steps, steady_time))
@@ -37,6 +37,19 @@ def check_tf_version():
     return version
 
 
+# set by BaseModel when train steps are XLA compiled,
+# layers built after it pick XLA compatible ops
+_XLA_COMPATIBLE = {'enabled': False}
+
+
+def set_xla_compatible(enabled):
+    _XLA_COMPATIBLE['enabled'] = bool(enabled)
+
+
+def is_xla_compatible():
+    return _XLA_COMPATIBLE['enabled']
+
+
 def get_layer_config(layer):
     if layer is None:
         return None
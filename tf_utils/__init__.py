@@ -1,2 +1,2 @@
 from .utils import *
-from .data_loader import ImageLoader, read_images
+from .data_loader import ImageLoader, decode_image, read_image, read_images
@@ -0,0 +1,51 @@
+import os
+import numpy as np
+from .utils import read_store_meta
+
+IMAGES_FILE = 'images.npy'
+LABELS_FILE = 'labels.npy'
+
+
+def create_array_store(store_dir, n_data, shape, use_label=False):
+    """
+    Create writable memmaps of images (N, C, H, W) uint8 and labels (N,).
+    shape: (C, H, W)
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    images = np.lib.format.open_memmap(os.path.join(store_dir, IMAGES_FILE),
+                                       mode='w+',
+                                       dtype=np.uint8,
+                                       shape=(n_data, *shape))
+    if not use_label:
+        return images, None
+    labels = np.lib.format.open_memmap(os.path.join(store_dir, LABELS_FILE),
+                                       mode='w+',
+                                       dtype=np.int64,
+                                       shape=(n_data,))
+    return images, labels
+
+
+def open_array_store(store_dir, use_label=False):
+    """
+    Open the store read-only. The mapping is backed by the page cache,
+    so concurrent runs on the same host share a single copy.
+    """
+    meta = read_store_meta(store_dir)
+    images = np.load(os.path.join(store_dir, IMAGES_FILE), mmap_mode='r')
+    if not use_label:
+        return images, None, meta
+    if not meta['use_label']:
+        raise ValueError('Array store was written without labels.')
+    labels = np.load(os.path.join(store_dir, LABELS_FILE), mmap_mode='r')
+    return images, labels, meta
+
+
+def gather_batch(images, labels, index):
+    """
+    Gather a batch with a single fancy-index read.
+    Sorted indices turn random reads into mostly forward reads.
+    """
+    index = np.sort(index)
+    if labels is None:
+        return images[index]
+    return images[index], labels[index]
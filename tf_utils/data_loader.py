@@ -1,85 +1,825 @@
 import os
+import functools
+import numpy as np
 import tensorflow as tf
 from collections import defaultdict
 from collections.abc import Iterable
-from .utils import find_images
+from .utils import find_images, read_store_meta
+from .tfrecord import parse_example, find_tfrecords
+from .array_store import open_array_store, gather_batch
+from .manifest import is_manifest, parse_manifest_lines
+from .permutation import permute, permutation_dataset
+from .resize_cache import ResizeCache
+from .data_service import get_service_address
 
+# Lines parsed per step when reading the dataset txt file.
+TXT_BATCH = 65536
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# DCT scaling ratios supported by libjpeg, largest first.
+JPEG_RATIOS = (8, 4, 2, 1)
 
-def read_images(path, shape=None, channel=3):
+
+def _parse_txt_lines(lines):
+    """
+    In-graph split of a batch of 'path[,label]' lines.
+    """
+    fields = tf.strings.split(tf.strings.strip(lines), ',', maxsplit=1)
+    fields = fields.to_tensor(default_value='', shape=(None, 2))
+    return {'path': fields[:, 0], 'label': fields[:, 1]}
+
+
+def _size_name(size, channel=3, crop=False):
+    """
+    Resize cache name of a (height, width) tensor, e.g. b'256x256x3c'.
+    """
+    return tf.strings.join([tf.strings.as_string(size[0]), 'x',
+                            tf.strings.as_string(size[1]), 'x',
+                            str(channel), 'c' if crop else ''])
+
+
+def _center_crop_window(height, width, new_size):
+    """
+    Largest centered window with the aspect ratio of `new_size`.
+    """
+    new_h, new_w = new_size[0], new_size[1]
+    crop_h = tf.minimum(height, width * new_h // new_w)
+    crop_w = tf.minimum(width, height * new_w // new_h)
+    return (height - crop_h) // 2, (width - crop_w) // 2, crop_h, crop_w
+
+
+def _jpeg_ratio_index(height, width, new_size):
+    """
+    Index of the largest ratio in JPEG_RATIOS whose output is
+    not smaller than `new_size`.
+    """
+    fits = [tf.logical_and(height // ratio >= new_size[0],
+                           width // ratio >= new_size[1])
+            for ratio in JPEG_RATIOS[:-1]]
+    fits.append(tf.constant(True))
+    return tf.argmax(tf.cast(tf.stack(fits), tf.int32), output_type=tf.int32)
+
+
+def decode_image(contents, channel=3, new_size=None, crop=False):
+    """
+    Format-aware decode into uint8 (H, W, C).
+    JPEGs are downscaled in the DCT domain as far as `new_size` allows,
+    and with `crop` only the centered window of the aspect ratio of
+    `new_size` is decoded. The output still needs a resize to `new_size`.
+    """
+    if new_size is None:
+        return tf.io.decode_image(contents,
+                                  channels=channel,
+                                  expand_animations=False)
+
+    def _decode_jpeg():
+        height, width = tf.unstack(tf.io.extract_jpeg_shape(contents)[:2])
+        if crop:
+            window = _center_crop_window(height, width, new_size)
+        else:
+            window = (0, 0, height, width)
+
+        def _decode_with_ratio(ratio):
+            if not crop:
+                return lambda: tf.io.decode_jpeg(contents,
+                                                 channels=channel,
+                                                 ratio=ratio)
+            # crop window is given in the downscaled coordinates
+            scaled_window = tf.stack([w // ratio for w in window])
+            return lambda: tf.io.decode_and_crop_jpeg(contents,
+                                                      scaled_window,
+                                                      channels=channel,
+                                                      ratio=ratio)
+
+        index = _jpeg_ratio_index(window[2], window[3], new_size)
+        return tf.switch_case(index, [_decode_with_ratio(ratio)
+                                      for ratio in JPEG_RATIOS])
+
+    def _decode_other():
+        image = tf.io.decode_image(contents,
+                                   channels=channel,
+                                   expand_animations=False)
+        if not crop:
+            return image
+        shape = tf.shape(image)
+        return tf.image.crop_to_bounding_box(
+            image, *_center_crop_window(shape[0], shape[1], new_size))
+
+    image = tf.cond(tf.io.is_jpeg(contents), _decode_jpeg, _decode_other)
+    image.set_shape((None, None, channel))
+    return image
+
+
+def read_image(path, new_size=None, channel=3, crop=False):
+    """
+    Decode an image file into uint8 (H, W, C), resized if `new_size`.
+    """
+    image = decode_image(tf.io.read_file(path),
+                         channel=channel,
+                         new_size=new_size,
+                         crop=crop)
+    if new_size is None:
+        return image
+    return resize_image(image, new_size, antialias=True)
+
+
+def resize_image(image, new_size, antialias=False):
+    """
+    Resize uint8 image and round back to uint8.
+    """
+    image = tf.image.resize(image, new_size, antialias=antialias)
+    return tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+
+
+def image_size(contents):
+    """
+    (height, width) of encoded image, read from the header
+    for JPEG and PNG. Other formats are decoded.
+    """
+    def _jpeg_size():
+        return tf.io.extract_jpeg_shape(contents)[:2]
+
+    def _png_size():
+        # IHDR chunk: big-endian uint32 width, height from byte 16
+        header = tf.io.decode_raw(tf.strings.substr(contents, 16, 8),
+                                  tf.uint8)
+        header = tf.reshape(tf.cast(header, tf.int32), (2, 4))
+        size = tf.reduce_sum(header * [[1 << 24, 1 << 16, 1 << 8, 1]],
+                             axis=1)
+        return tf.reverse(size, axis=[0])
+
+    def _decoded_size():
+        return tf.shape(tf.io.decode_image(contents,
+                                           expand_animations=False))[:2]
+
+    is_png = tf.equal(tf.strings.substr(contents, 0, 8), PNG_SIGNATURE)
+    return tf.cond(tf.io.is_jpeg(contents),
+                   _jpeg_size,
+                   lambda: tf.cond(is_png, _png_size, _decoded_size))
+
+
+def aspect_buckets(new_size, n_bucket, max_ratio=2.0, multiple=32):
+    """
+    `n_bucket` (height, width) shapes with about the area of `new_size`,
+    aspect ratios log-spaced in [1 / max_ratio, max_ratio],
+    each side a multiple of `multiple`.
+    """
+    area = new_size[0] * new_size[1]
+    ratios = np.exp(np.linspace(-np.log(max_ratio), np.log(max_ratio),
+                                n_bucket)) if n_bucket > 1 else [1.0]
+    shapes = []
+    for ratio in ratios:
+        height = np.sqrt(area / ratio)
+        width = height * ratio
+        shapes.append([max(int(round(side / multiple)) * multiple, multiple)
+                       for side in (height, width)])
+    return np.array(shapes, np.int32)
+
+
+def assign_buckets(sizes, bucket_shapes):
+    """
+    Index of the bucket with the closest aspect ratio for every
+    (height, width) in `sizes`.
+    """
+    sizes = np.maximum(np.asarray(sizes, np.float64), 1)
+    ratio = np.log(sizes[:, 1] / sizes[:, 0])
+    bucket_ratio = np.log(bucket_shapes[:, 1] / bucket_shapes[:, 0])
+    return np.abs(ratio[:, None] - bucket_ratio[None]).argmin(axis=1)
+
+
+def read_images(path, shape=None, channel=3, data_format='channels_first'):
+    """
+    Decode and resize images in parallel into one preallocated batch.
+    Without `shape`, all images are resized to the largest height and width.
+    Returns (batch, original (height, width) of each image).
+    """
     images = find_images(path)
+    paths = tf.data.Dataset.from_tensor_slices(images)
 
-    images_array = []
-    images_shape = []
-    max_h = 0
-    max_w = 0
-    for image in images:
-        image = tf.io.decode_png(tf.io.read_file(image), channels=channel)
-        image = tf.cast(image, tf.float32)
-        h, w, _ = image.shape
-        images_array.append(image / 127.5 - 1)
-        images_shape.append((h, w))
-        if max_h < h:
-            max_h = h
-        if max_w < w:
-            max_w = w
-
-    if shape is not None:
-        images_array = [tf.image.resize(image_array, shape)
-                        for image_array in images_array]
-    else:
-        images_array = [tf.image.resize(image_array, (max_h, max_w))
-                        for image_array in images_array]
-    images_array = tf.convert_to_tensor(images_array)
-    images_array = tf.transpose(images_array, (0, 3, 1, 2))
+    if shape is None:
+        sizes = paths.map(
+            lambda p: image_size(tf.io.read_file(p)),
+            num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        sizes = np.stack(list(sizes.as_numpy_iterator()))
+        shape = tuple(int(s) for s in sizes.max(axis=0))
+
+    def _read(path):
+        contents = tf.io.read_file(path)
+        image = decode_image(contents, channel=channel, new_size=shape)
+        return resize_image(image, shape), image_size(contents)
 
-    images_shape = tf.convert_to_tensor(images_shape)
+    dataset = paths.map(
+        _read,
+        num_parallel_calls=tf.data.experimental.AUTOTUNE
+    ).prefetch(tf.data.experimental.AUTOTUNE)
 
-    return images_array, images_shape
+    if data_format == 'channels_first':
+        images_array = np.empty((len(images), channel, *shape), np.uint8)
+    else:
+        images_array = np.empty((len(images), *shape, channel), np.uint8)
+    images_shape = np.empty((len(images), 2), np.int32)
+    for i, (image, size) in enumerate(dataset.as_numpy_iterator()):
+        if data_format == 'channels_first':
+            image = image.transpose(2, 0, 1)
+        images_array[i] = image
+        images_shape[i] = size
+
+    images_array = tf.cast(images_array, tf.float32) / 127.5 - 1
+    return images_array, tf.convert_to_tensor(images_shape)
 
 
 class ImageLoader:
-    def __init__(self, data_txt_file, use_label=False):
+    def __init__(self,
+                 data_txt_file,
+                 use_label=False,
+                 backend='file',
+                 backend_path=None,
+                 shuffle_buffer=None,
+                 cache_file=None,
+                 center_crop=False,
+                 class_temperature=None,
+                 echo_factor=1,
+                 echo_max=None,
+                 echo_level='batch',
+                 echo_buffer=None,
+                 aspect_buckets=None,
+                 resize_cache=None,
+                 resize_cache_levels=None,
+                 data_service=None):
+        """
+        backend: 'file' reads images listed in `data_txt_file`,
+                 'tfrecord' reads pre-resized uint8 shards in `backend_path`,
+                 'memmap' reads a uint8 (N, C, H, W) array store
+                 in `backend_path`.
+        center_crop: decode only the centered window with the aspect
+                     ratio of `new_size` instead of stretching.
+        class_temperature: None samples files uniformly. Otherwise each
+                           class is drawn with weight count**temperature,
+                           0 gives uniform classes.
+        echo_factor: repeat every decoded batch ('batch' `echo_level`)
+                     or image ('example') this many times, so reads are
+                     shared across steps when input bound.
+                     The copies are shuffled apart in `echo_buffer`.
+        echo_max: adapt the factor up to `echo_max` from the input wait
+                  measured by the Trainer, see `adapt_echo`.
+                  Fixed factor if None.
+        aspect_buckets: number of aspect-ratio buckets. Images are cropped
+                        and resized to the bucket of their aspect ratio,
+                        with about the area of `new_size`, and every
+                        batch has the shape of one bucket. Only for
+                        models that take any spatial size.
+        resize_cache: directory of a persistent cache of resized images,
+                      shared between runs and configs.
+        resize_cache_levels: heights also stored on a cache miss, e.g.
+                             [64, 128, 256] to fill every resolution
+                             with one file read.
+        data_service: decode and batch on tf.data service workers,
+                      either the number of worker processes started on
+                      localhost or the address of a running dispatcher.
+                      Not for memmap or `resize_cache`, which run Python.
+        """
         self.data_format = tf.keras.backend.image_data_format()
+        self.use_label = use_label
+        self.backend = (backend or 'file').lower()
+        self.backend_path = backend_path
+        self.shuffle_buffer = shuffle_buffer
+        self.cache_file = cache_file
+        self.center_crop = center_crop
+        self.class_temperature = class_temperature
+        self.echo_level = echo_level
+        self.echo_max = echo_max
+        self.echo_buffer = echo_buffer
+        self.echo = None
+        self.echo_counts = None
+        self.aspect_buckets = aspect_buckets
+        self.bucket_shapes = None
+        self._bucket_ids = None
+        self.resize_cache = None
+        if resize_cache is not None:
+            self.resize_cache = ResizeCache(resize_cache,
+                                            resize_cache_levels)
+        self.data_service = data_service
+        if data_service is not None and (self.backend == 'memmap' or
+                                         resize_cache is not None):
+            raise ValueError('`data_service` workers cannot run the '
+                             'Python reads of memmap or `resize_cache`.')
+        if echo_factor > 1 or echo_max is not None:
+            self.echo = tf.Variable(echo_factor, trainable=False,
+                                    dtype=tf.int64)
+            # number of (fresh, echoed) elements
+            self.echo_counts = tf.Variable([0, 0], trainable=False,
+                                           dtype=tf.int64)
         self.n_data = None
         self.n_class = None
+        self.n_shard = None
+        self.image_shape = None
+        self.image_sizes = None
+        self._images = None
+        self._labels = None
+        self._paths = None
+        self._label_ids = None
+        self._shards = None
+        self._class_indices = None
+        self.position = None
         self.class_dict = defaultdict(ClassCounter())
         self.class_dict_pair = None
-        self.dataset = self._read_txt(data_txt_file, use_label)
+        if self.backend == 'file':
+            self.dataset = self._read_txt(data_txt_file, use_label)
+        elif self.backend == 'tfrecord':
+            self.dataset = self._read_tfrecord(backend_path, use_label)
+        elif self.backend == 'memmap':
+            self.dataset = self._read_array_store(backend_path, use_label)
+        else:
+            raise ValueError(f'Unsupported `backend`: {backend}')
+        if class_temperature is not None:
+            self._class_indices = self._get_class_indices()
+
+    @classmethod
+    def from_config(cls, dataset_conf, use_label=False):
+        return cls(data_txt_file=dataset_conf['train_data_txt'],
+                   use_label=use_label,
+                   backend=dataset_conf.get('backend', 'file'),
+                   backend_path=dataset_conf.get('backend_path'),
+                   shuffle_buffer=dataset_conf.get('shuffle_buffer'),
+                   cache_file=dataset_conf.get('cache_file'),
+                   center_crop=dataset_conf.get('center_crop', False),
+                   class_temperature=dataset_conf.get('class_temperature'),
+                   echo_factor=dataset_conf.get('echo_factor', 1),
+                   echo_max=dataset_conf.get('echo_max'),
+                   echo_level=dataset_conf.get('echo_level', 'batch'),
+                   echo_buffer=dataset_conf.get('echo_buffer'),
+                   aspect_buckets=dataset_conf.get('aspect_buckets'),
+                   resize_cache=dataset_conf.get('resize_cache'),
+                   resize_cache_levels=dataset_conf.get('resize_cache_levels'),
+                   data_service=dataset_conf.get('data_service'))
 
     def _read_txt(self, txt, use_label):
+        """
+        Parse the txt file (or manifest) in-graph, batch by batch.
+        Paths and labels are kept as tensors instead of Python lists,
+        labels are mapped by a table built from one vocabulary pass.
+        """
         data_dir = os.path.dirname(txt)
-        with open(txt, 'r', encoding='utf-8') as txt_file:
-            if not use_label:
-                data = [os.path.join(data_dir, line.strip().split(',')[0])
-                        for line in txt_file.readlines()]
-                dataset = tf.data.Dataset.from_tensor_slices(data)
-            else:
-                data = []
-                labels = []
-                for line in txt_file.readlines():
-                    path, label = line.strip().split(',')
-                    file_path = os.path.join(data_dir, path)
-                    data.append(file_path)
-                    labels.append(self.class_dict[label])
-                dataset = tf.data.Dataset.from_tensor_slices((data, labels))
-        self.n_data = len(data)
+        lines = tf.data.TextLineDataset(txt)
+        if is_manifest(txt):
+            # invalid files found by the preflight scan are skipped
+            lines = lines.skip(1)
+            parse_func = parse_manifest_lines
+        else:
+            parse_func = _parse_txt_lines
+        lines = lines.filter(lambda line: tf.strings.length(line) > 0)
+
+        fields = defaultdict(list)
+        for batch in lines.batch(TXT_BATCH).map(parse_func):
+            for key, value in batch.items():
+                fields[key].append(value)
+        if not fields:
+            raise ValueError(f'No images listed in {txt}.')
+        fields = {key: tf.concat(value, axis=0)
+                  for key, value in fields.items()}
+        if 'size' in fields:
+            self.image_sizes = fields['size'].numpy()
+
+        self._paths = tf.strings.join(
+            [os.path.join(data_dir, '') if data_dir else '', fields['path']])
+        if not use_label:
+            dataset = tf.data.Dataset.from_tensor_slices(self._paths)
+        else:
+            # classes are numbered in order of first appearance
+            vocab, _ = tf.unique(fields['label'])
+            for class_name in vocab.numpy():
+                self.class_dict[class_name.decode('utf-8')]
+            table = tf.lookup.StaticHashTable(
+                tf.lookup.KeyValueTensorInitializer(
+                    vocab, tf.range(tf.size(vocab), dtype=tf.int32)),
+                default_value=-1)
+            self._label_ids = table.lookup(fields['label'])
+            dataset = tf.data.Dataset.from_tensor_slices(
+                (self._paths, self._label_ids))
+        self.n_data = int(tf.size(self._paths))
         self.n_class = len(self.class_dict)
         self.class_dict_pair = dict(zip(self.class_dict.values(),
                                         self.class_dict.keys()))
         return dataset
 
+    def _read_tfrecord(self, tfrecord_dir, use_label):
+        if tfrecord_dir is None:
+            raise ValueError("'backend_path' is required for tfrecord.")
+        meta = read_store_meta(tfrecord_dir)
+        if use_label and not meta['use_label']:
+            raise ValueError('TFRecord shards were written without labels.')
+        shards = find_tfrecords(tfrecord_dir)
+        self.n_shard = len(shards)
+        self._shards = tf.constant(shards)
+        self._set_store_meta(meta)
+        return tf.data.Dataset.from_tensor_slices(shards)
+
+    def _read_array_store(self, store_dir, use_label):
+        if store_dir is None:
+            raise ValueError("'backend_path' is required for memmap.")
+        self._images, self._labels, meta = open_array_store(store_dir,
+                                                            use_label)
+        self._set_store_meta(meta)
+        return tf.data.Dataset.range(self.n_data)
+
+    def _set_store_meta(self, meta):
+        for class_name in meta['class_names']:
+            self.class_dict[class_name]
+        self.n_data = meta['n_data']
+        self.n_class = len(self.class_dict)
+        self.class_dict_pair = dict(zip(self.class_dict.values(),
+                                        self.class_dict.keys()))
+        self.image_shape = (meta['height'], meta['width'], meta['channel'])
+
     def _read_file(self, data, label=None, new_size=None, channel=3):
-        data = tf.io.decode_png(tf.io.read_file(data), channels=channel)
+        # bucketed images are cropped to the bucket aspect ratio
+        crop = self.center_crop or self._bucket_ids is not None
+        if self.resize_cache is not None and new_size is not None:
+            data = self._read_file_cached(data, new_size, channel, crop)
+        else:
+            data = decode_image(tf.io.read_file(data),
+                                channel=channel,
+                                new_size=new_size,
+                                crop=crop)
+            data = self._resize_image(data, new_size)
+        if label is None:
+            return data
+        return data, label
+
+    def _read_file_cached(self, path, new_size, channel=3, crop=False):
+        """
+        Read through `resize_cache`. A miss reads the file once and
+        decodes every pyramid level like an uncached read, with its own
+        JPEG scale, then stores all levels of the entry.
+        """
+        new_size = tf.cast(new_size, tf.int32)
+        sizes = [new_size] + [
+            tf.stack([level, level * new_size[1] // new_size[0]])
+            for level in self.resize_cache.levels]
+        names = tf.stack([_size_name(size, channel, crop)
+                          for size in sizes])
+        image, hit = tf.numpy_function(self.resize_cache.lookup,
+                                       [path, names[0]],
+                                       [tf.uint8, tf.bool])
+
+        def _fill():
+            contents = tf.io.read_file(path)
+            resized = [resize_image(decode_image(contents,
+                                                 channel=channel,
+                                                 new_size=size,
+                                                 crop=crop), size)
+                       for size in sizes]
+            stored = tf.numpy_function(self.resize_cache.store,
+                                       [path, names, *resized], tf.bool)
+            with tf.control_dependencies([stored]):
+                return tf.identity(resized[0])
+
+        image = tf.cond(hit, lambda: image, _fill)
+        image.set_shape((None, None, channel))
+        return image
+
+    def _read_record(self, serialized, new_size=None):
+        data = parse_example(serialized, self.image_shape, self.use_label)
+        if not self.use_label:
+            return self._resize_image(data, new_size)
+        data, label = data
+        return self._resize_image(data, new_size), label
+
+    def _read_array_batch(self, index, new_size=None):
+        height, width, channel = self.image_shape
+        if self.use_label:
+            data, label = tf.numpy_function(
+                lambda i: gather_batch(self._images, self._labels, i),
+                [index], [tf.uint8, tf.int64])
+            label = tf.cast(label, tf.float32)
+        else:
+            data = tf.numpy_function(
+                lambda i: gather_batch(self._images, None, i),
+                [index], tf.uint8)
+            label = None
+        data.set_shape((None, channel, height, width))
         data = tf.cast(data, tf.float32)
-        if new_size is not None:
-            data = tf.image.resize(data, new_size)
-        if self.data_format == 'channels_first':
-            data = tf.transpose(data, perm=(2, 0, 1))
+
+        if new_size is not None and not self._is_stored_size(new_size):
+            data = tf.image.resize(tf.transpose(data, (0, 2, 3, 1)),
+                                   new_size)
+            if self.data_format == 'channels_first':
+                data = tf.transpose(data, (0, 3, 1, 2))
+        elif self.data_format == 'channels_last':
+            data = tf.transpose(data, (0, 2, 3, 1))
         if label is None:
             return data
-        label = tf.cast(label, tf.float32)
         return data, label
 
+    def _resize_image(self, data, new_size=None):
+        if new_size is None or self._is_stored_size(new_size):
+            return data
+        return resize_image(data, new_size)
+
+    def _format_batch(self, data, label=None):
+        """
+        uint8 (N, H, W, C) batch to float32 batch of `data_format`.
+        """
+        data = tf.cast(data, tf.float32)
+        if self.data_format == 'channels_first':
+            data = tf.transpose(data, perm=(0, 3, 1, 2))
+        if label is None:
+            return data, None
+        return data, tf.cast(label, tf.float32)
+
+    def _is_stored_size(self, new_size):
+        if self.image_shape is None:
+            return False
+        return tuple(new_size) == tuple(self.image_shape[:2])
+
+    def _get_class_indices(self):
+        if not self.use_label:
+            raise ValueError('Class sampling needs `use_label=True`.')
+        if self.backend == 'memmap':
+            labels = np.asarray(self._labels)
+        elif self.backend == 'file':
+            labels = self._label_ids.numpy()
+        else:
+            raise ValueError('Class sampling needs indexed reads, '
+                             f'not supported by {self.backend} backend.')
+        return [np.flatnonzero(labels == i) for i in range(self.n_class)]
+
+    def _class_index_dataset(self, seed, start=0):
+        """
+        n_data indices drawn class by class with `class_temperature`
+        weights. Every class is an endless stream of its own
+        permutations, so no rejection pass is needed.
+        """
+        counts = np.array([len(i) for i in self._class_indices], np.float64)
+        weights = counts ** self.class_temperature
+        key = tf.random.stateless_uniform((), seed=seed, minval=0,
+                                          maxval=tf.int64.max,
+                                          dtype=tf.int64)
+
+        def _class_dataset(class_id, index):
+            n_index = len(index)
+            index = tf.constant(index, tf.int64)
+            return tf.data.Dataset.range(tf.int64.max).flat_map(
+                lambda rounds: permutation_dataset(
+                    n_index, tf.stack([key + class_id, rounds])
+                ).map(lambda i: tf.gather(index, i)))
+
+        datasets = [_class_dataset(class_id, index)
+                    for class_id, index in enumerate(self._class_indices)
+                    if len(index)]
+        dataset = tf.data.experimental.sample_from_datasets(
+            datasets, weights=(weights[counts > 0] / weights.sum()).tolist(),
+            seed=key)
+        return dataset.take(self.n_data).skip(start)
+
+    def _interleave_records(self, seed=None, shuffle=True,
+                            input_context=None):
+        """
+        Read shards in parallel. The interleave order is deterministic,
+        so the same shard order always yields the same record order.
+        With `input_context`, every input pipeline reads its own shards.
+        tf.data auto-sharding cannot find the files below the epoch
+        `flat_map`, so the shards are split here.
+        """
+        files = self.dataset
+        if shuffle:
+            files = tf.data.Dataset.from_tensor_slices(
+                tf.gather(self._shards, permute(tf.range(self.n_shard),
+                                                self.n_shard, seed)))
+        if input_context is not None:
+            files = files.shard(input_context.num_input_pipelines,
+                                input_context.input_pipeline_id)
+        dataset = files.interleave(
+            tf.data.TFRecordDataset,
+            cycle_length=min(self.n_shard, 16),
+            num_parallel_calls=tf.data.experimental.AUTOTUNE,
+            deterministic=True)
+        if input_context is not None:
+            return dataset
+        return dataset.apply(
+            tf.data.experimental.assert_cardinality(self.n_data))
+
+    def _read_index(self, index, channel=3, new_size=None):
+        data = tf.gather(self._paths, index)
+        if not self.use_label:
+            return self._read_file(data, new_size=new_size, channel=channel)
+        return self._read_file(data, tf.gather(self._label_ids, index),
+                               new_size=new_size, channel=channel)
+
+    def _get_epoch_dataset(self,
+                           epoch,
+                           offset,
+                           seed,
+                           batch_size,
+                           channel=3,
+                           new_size=None,
+                           shuffle=True,
+                           drop_remainder=True,
+                           cached=None,
+                           input_context=None):
+        """
+        Batches of `epoch`, starting from batch `offset`.
+        The order only depends on (seed, epoch). Index backends start
+        the permutation at the offset, record streams skip before
+        the decode.
+        """
+        epoch_seed = tf.stack([seed, epoch])
+        n_skip = offset * batch_size
+        if self._bucket_ids is not None:
+            # batches are formed per bucket, so skip whole batches
+            n_skip = 0
+        if cached is not None or self.backend == 'tfrecord':
+            if cached is not None:
+                dataset = cached
+            else:
+                dataset = self._interleave_records(epoch_seed, shuffle,
+                                                   input_context)
+            if shuffle:
+                # a full buffer would hold a second copy of the cache in
+                # memory and fill for a whole epoch before the first batch
+                buffer_size = self.shuffle_buffer or min(self.n_data, 10000)
+                dataset = dataset.shuffle(
+                    buffer_size,
+                    seed=tf.random.stateless_uniform(
+                        (), seed=epoch_seed, minval=0,
+                        maxval=tf.int64.max, dtype=tf.int64))
+            # the shuffle buffer order needs every earlier record, so
+            # resuming reads O(offset) records, skipped before the decode
+            dataset = dataset.skip(n_skip)
+            if cached is None:
+                dataset = dataset.map(
+                    map_func=functools.partial(self._read_record,
+                                               new_size=new_size),
+                    num_parallel_calls=tf.data.experimental.AUTOTUNE)
+            return self._echo(dataset, 'example').batch(
+                batch_size=batch_size, drop_remainder=drop_remainder)
+
+        if self._class_indices is not None:
+            dataset = self._class_index_dataset(epoch_seed, start=n_skip)
+        else:
+            # indices come from a keyed bijection instead of a shuffle
+            # buffer, so a full shuffle needs no fill time and constant
+            # memory
+            dataset = permutation_dataset(self.n_data, epoch_seed,
+                                          start=n_skip, shuffle=shuffle)
+        if self._bucket_ids is not None:
+            return self._bucket_batches(dataset, offset, batch_size, channel)
+        if self.backend == 'memmap':
+            # gather whole batches of indices instead of single images
+            return dataset.batch(
+                batch_size=batch_size,
+                drop_remainder=drop_remainder
+            ).map(
+                map_func=functools.partial(self._read_array_batch,
+                                           new_size=new_size),
+                num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        dataset = dataset.map(
+            map_func=functools.partial(self._read_index,
+                                       channel=channel,
+                                       new_size=new_size),
+            num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        return self._echo(dataset, 'example').batch(
+            batch_size=batch_size, drop_remainder=drop_remainder)
+
+    def _set_buckets(self, new_size):
+        if self.backend != 'file':
+            raise ValueError('Aspect-ratio buckets need the file backend, '
+                             f'{self.backend} stores one size.')
+        if new_size is None:
+            raise ValueError('Aspect-ratio buckets need `new_size`.')
+        if self.image_sizes is None:
+            self.image_sizes = self._read_image_sizes()
+        self.bucket_shapes = aspect_buckets(new_size, self.aspect_buckets)
+        self._bucket_ids = assign_buckets(self.image_sizes,
+                                          self.bucket_shapes)
+
+    def _read_image_sizes(self):
+        """
+        (height, width) of every image from the file headers,
+        for txt files without manifest sizes.
+        """
+        sizes = tf.data.Dataset.from_tensor_slices(self._paths).map(
+            lambda path: image_size(tf.io.read_file(path)),
+            num_parallel_calls=tf.data.experimental.AUTOTUNE
+        ).batch(TXT_BATCH)
+        return np.concatenate(list(sizes.as_numpy_iterator()))
+
+    def _bucket_batches(self, index, offset, batch_size, channel=3):
+        """
+        Group indices by bucket before reading, so every batch has one
+        shape and skipping batches only skips indices. Incomplete
+        batches of each bucket are dropped.
+        """
+        bucket_ids = tf.constant(self._bucket_ids, tf.int64)
+        shapes = tf.constant(self.bucket_shapes, tf.int32)
+        index = index.apply(tf.data.experimental.group_by_window(
+            key_func=lambda i: tf.gather(bucket_ids, i),
+            reduce_func=lambda _, window: window.batch(batch_size,
+                                                       drop_remainder=True),
+            window_size=batch_size)).skip(offset)
+
+        def _read(i):
+            new_size = tf.gather(shapes, tf.gather(bucket_ids, i))
+            return self._read_index(i, channel=channel, new_size=new_size)
+
+        # the ordered map keeps the grouped (full) batches intact
+        return index.unbatch().map(
+            map_func=_read,
+            num_parallel_calls=tf.data.experimental.AUTOTUNE
+        ).batch(batch_size, drop_remainder=True)
+
+    def _echo_level(self):
+        """
+        memmap and buckets read whole batches, so they always
+        echo batches whatever `echo_level` is. So does the data
+        service, variables do not reach its workers.
+        """
+        if self.backend == 'memmap' or self._bucket_ids is not None or \
+                self.data_service is not None:
+            return 'batch'
+        return self.echo_level
+
+    def _echo(self, dataset, level):
+        """
+        Repeat every element `echo` times, then shuffle the copies apart.
+        """
+        if self.echo is None or level != self._echo_level():
+            return dataset
+
+        def _repeat(*element):
+            factor = self.echo.read_value()
+            count = self.echo_counts.assign_add(tf.stack([1, factor - 1]))
+            with tf.control_dependencies([count]):
+                element = tf.nest.map_structure(tf.identity, element)
+            if len(element) == 1:
+                element = element[0]
+            return tf.data.Dataset.from_tensors(element).repeat(factor)
+
+        buffer_size = self.echo_buffer or (
+            64 if level == 'batch' else 1024)
+        return dataset.flat_map(_repeat).shuffle(buffer_size)
+
+    def adapt_echo(self, wait_ratio):
+        """
+        One more echo when input wait exceeds 10% of the step time,
+        one less when it is under 1%.
+        """
+        factor = int(self.echo.numpy())
+        if wait_ratio > 0.1:
+            factor = min(factor + 1, self.echo_max)
+        elif wait_ratio < 0.01:
+            factor = max(factor - 1, 1)
+        self.echo.assign(factor)
+
+    def echo_stats(self):
+        """
+        Current echo factor and the share of echoed elements,
+        empty without echoing.
+        """
+        if self.echo_counts is None:
+            return {}
+        fresh, echoed = self.echo_counts.numpy()
+        return {'echo': int(self.echo.numpy()),
+                'echo_ratio': echoed / max(fresh + echoed, 1)}
+
+    def _get_cached_dataset(self, channel=3, new_size=None,
+                            input_context=None):
+        """
+        Decoded (and resized) uint8 images (H, W, C) in stored order,
+        cached in memory or in `cache_file`.
+        """
+        if self.backend == 'tfrecord':
+            dataset = self._interleave_records(shuffle=False,
+                                               input_context=input_context)
+            read_func = functools.partial(self._read_record,
+                                          new_size=new_size)
+        else:
+            dataset = self.dataset
+            read_func = functools.partial(self._read_file,
+                                          new_size=new_size,
+                                          channel=channel)
+        return dataset.map(
+            map_func=read_func,
+            num_parallel_calls=tf.data.experimental.AUTOTUNE
+        ).cache(self.cache_file or '')
+
+    def steps_per_epoch(self, batch_size, drop_remainder=True):
+        if self._bucket_ids is not None:
+            counts = np.bincount(self._bucket_ids,
+                                 minlength=len(self.bucket_shapes))
+            return max(int(np.sum(counts // batch_size)), 1)
+        if drop_remainder:
+            return max(self.n_data // batch_size, 1)
+        return -(-self.n_data // batch_size)
+
+    def set_position(self, step):
+        """
+        Move the dataset of the last seeded `get_dataset` call to
+        global batch `step`, e.g. the restored checkpoint step.
+        Takes effect on the next iterator. With echoing, steps and read
+        batches differ, so the resume is only approximate.
+        """
+        self.position.assign(tf.cast(step, tf.int64))
+
     def get_dataset(self,
                     batch_size,
                     channel=3,
@@ -89,32 +829,111 @@ class ImageLoader:
                     flatten=False,
                     shuffle=True,
                     drop_remainder=True,
-                    cache=True):
+                    cache=True,
+                    seed=None,
+                    repeat=False,
+                    input_context=None):
         """
         new_size = (height, width)
+        cache: cache decoded uint8 images in memory, or in `cache_file`.
+               Shuffle and batch run after the cache,
+               so every epoch has a new order. The cache is shuffled
+               in a `shuffle_buffer` window (default 10000), not with
+               the full permutation of uncached reads.
+               Not used with `class_temperature`, `aspect_buckets`
+               or `data_service`.
+        seed: the order of every epoch is a function of (seed, epoch),
+              so `set_position(step)` resumes exactly at batch `step`.
+              Index backends start there directly. Record streams
+              (tfrecord and `cache`) replay the shuffle of the epoch
+              up to the batch, reading but not decoding up to one
+              epoch of records. Random and not resumable if None.
+        repeat: iterate epochs endlessly instead of one per iterator.
+        input_context: tf.distribute.InputContext of
+                       `strategy.distribute_datasets_from_function`,
+                       tfrecord only. Every input pipeline reads its own
+                       shards, `batch_size` is the per pipeline batch.
+                       Datasets of `experimental_distribute_dataset`
+                       are sharded by element instead, every worker
+                       reads all shards.
         """
-        dataset = self.dataset
-        if shuffle:
-            dataset = dataset.shuffle(self.n_data)
+        if self.image_shape is not None and channel != self.image_shape[-1]:
+            raise ValueError(f'`channel` {channel} does not match '
+                             f'stored channel {self.image_shape[-1]}.')
+        n_pipeline = 1
+        if input_context is not None:
+            if self.backend != 'tfrecord':
+                raise ValueError('`input_context` shards tfrecord files, '
+                                 f'not the {self.backend} backend.')
+            n_pipeline = input_context.num_input_pipelines
+            if self.n_shard < n_pipeline:
+                raise ValueError(f'{self.n_shard} shards for '
+                                 f'{n_pipeline} input pipelines.')
+        resumable = seed is not None
+        if not resumable:
+            seed = np.random.randint(2**31 - 1)
+        seed = tf.constant(seed, tf.int64)
 
-        dataset = dataset.map(
-            map_func=lambda x, y=None: self._read_file(
-                x, label=y, new_size=new_size, channel=channel),
-            num_parallel_calls=tf.data.experimental.AUTOTUNE
-        ).batch(
-            batch_size=batch_size,
-            drop_remainder=drop_remainder
-        )
-
-        if (not scailing
-            and map_func is None
-            and new_size is None
-                and not flatten):
-            if cache:
-                dataset = dataset.cache()
-            return dataset.prefetch(tf.data.experimental.AUTOTUNE)
+        if self.aspect_buckets:
+            self._set_buckets(new_size)
+        cached = None
+        # class sampling reads by index, the cache is a stream
+        if cache and self.backend != 'memmap' and \
+                self._class_indices is None and self._bucket_ids is None \
+                and self.data_service is None:
+            cached = self._get_cached_dataset(channel=channel,
+                                              new_size=new_size,
+                                              input_context=input_context)
+        get_epoch_dataset = functools.partial(self._get_epoch_dataset,
+                                              seed=seed,
+                                              batch_size=batch_size,
+                                              channel=channel,
+                                              new_size=new_size,
+                                              shuffle=shuffle,
+                                              drop_remainder=drop_remainder,
+                                              cached=cached,
+                                              input_context=input_context)
+
+        # global batch position; each new iterator starts the next epoch
+        position = tf.Variable(0, trainable=False, dtype=tf.int64)
+        if resumable:
+            self.position = position
+        # steps of the global batch over all input pipelines
+        n_step = self.steps_per_epoch(batch_size * n_pipeline,
+                                      drop_remainder)
+
+        service = None
+        if self.data_service is not None:
+            service = get_service_address(self.data_service)
+
+        def _epoch_dataset(epoch, offset):
+            dataset = get_epoch_dataset(epoch, offset)
+            if service is None:
+                return dataset
+            # the source is split between workers, so the order inside
+            # an epoch depends on worker timing
+            return dataset.apply(tf.data.experimental.service.distribute(
+                processing_mode='distributed_epoch', service=service))
+
+        def _start_dataset(_):
+            start = position.read_value()
+            epoch = start // n_step
+            offset = start % n_step
+            with tf.control_dependencies(
+                    [position.assign((epoch + 1) * n_step)]):
+                epoch = tf.identity(epoch)
+            if not repeat:
+                return _epoch_dataset(epoch, offset)
+            return tf.data.Dataset.range(epoch, tf.int64.max).flat_map(
+                lambda e: _epoch_dataset(
+                    e, tf.where(e == epoch, offset, tf.constant(0, tf.int64))))
+
+        dataset = tf.data.Dataset.range(1).flat_map(_start_dataset)
+        dataset = self._echo(dataset, 'batch')
 
         def _total_map_func(data, label=None):
+            if self.backend != 'memmap':
+                data, label = self._format_batch(data, label)
             if scailing:
                 data = data / 127.5 - 1
             if flatten:
@@ -128,8 +947,6 @@ class ImageLoader:
         dataset = dataset.map(
             map_func=_total_map_func,
             num_parallel_calls=tf.data.experimental.AUTOTUNE)
-        if cache:
-            dataset = dataset.cache()
         return dataset.prefetch(tf.data.experimental.AUTOTUNE)
 
     def get_label(self, str_label=None, num_label=None):
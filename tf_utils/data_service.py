@@ -0,0 +1,60 @@
+import atexit
+import multiprocessing
+import tensorflow as tf
+
+# dispatcher and worker processes of this process, started once
+_LOCAL_SERVICE = {}
+
+
+def _run_worker(dispatcher_address):
+    # decode workers stay on CPU and leave the GPUs to the trainer
+    tf.config.set_visible_devices([], 'GPU')
+    worker = tf.data.experimental.service.WorkerServer(
+        tf.data.experimental.service.WorkerConfig(
+            dispatcher_address=dispatcher_address))
+    worker.join()
+
+
+def _stop_workers(workers):
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.join()
+
+
+def start_local_service(n_worker):
+    """
+    Start a tf.data service dispatcher in this process and `n_worker`
+    worker processes on localhost. Started once per process,
+    later calls return the running service.
+    Returns the service address for `service.distribute`.
+    """
+    if 'target' in _LOCAL_SERVICE:
+        return _LOCAL_SERVICE['target']
+    dispatcher = tf.data.experimental.service.DispatchServer()
+    dispatcher_address = dispatcher.target.split('://')[-1]
+
+    # spawn, the trainer process already holds a TF runtime
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_run_worker,
+                               args=(dispatcher_address,),
+                               daemon=True)
+               for _ in range(n_worker)]
+    for worker in workers:
+        worker.start()
+    atexit.register(_stop_workers, workers)
+
+    _LOCAL_SERVICE.update(target=dispatcher.target,
+                          dispatcher=dispatcher,
+                          workers=workers)
+    return dispatcher.target
+
+
+def get_service_address(data_service):
+    """
+    data_service: number of local workers, or the address of a
+                  running dispatcher, e.g. 'grpc://host:5050'.
+    """
+    if isinstance(data_service, str):
+        return data_service
+    return start_local_service(int(data_service))
@@ -0,0 +1,98 @@
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+
+
+def _load_gray(path, hash_size=HASH_SIZE):
+    """
+    (hash_size, hash_size + 1) grayscale thumbnail, or None if unreadable.
+    JPEGs are reduced while decoding.
+    """
+    try:
+        with Image.open(path) as image:
+            image.draft('L', (hash_size * 8, hash_size * 8))
+            image = image.convert('L').resize((hash_size + 1, hash_size),
+                                              Image.BILINEAR)
+            return np.asarray(image, np.int16)
+    except Exception:
+        return None
+
+
+def dhash_batch(paths, hash_size=HASH_SIZE):
+    """
+    Difference hashes of a batch of images as uint64 (hash_size=8).
+    Thumbnails are stacked, so the gradient sign and bit packing run
+    once per batch. Unreadable images get hash 0 and valid False.
+    """
+    thumbnails = [_load_gray(path, hash_size) for path in paths]
+    valid = np.array([t is not None for t in thumbnails])
+    stack = np.zeros((len(paths), hash_size, hash_size + 1), np.int16)
+    if valid.any():
+        stack[valid] = np.stack([t for t in thumbnails if t is not None])
+    bits = stack[:, :, 1:] > stack[:, :, :-1]
+    hashes = np.packbits(bits.reshape(len(paths), -1), axis=1)
+    hashes = hashes.view('>u8').reshape(-1).astype(np.uint64)
+    return hashes, valid
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance. A radius query only
+    visits children whose edge distance is within the radius of the
+    query distance, far fewer than all N hashes.
+    """
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        node = (value, item, {})
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def query(self, value, radius):
+        """
+        Items within `radius` of `value` as [(distance, item)].
+        """
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append((distance, item))
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def find_duplicates(hashes, max_distance=4):
+    """
+    Index of the first near-duplicate of every hash (-1 if none),
+    scanning in order, so the earliest copy is kept.
+    """
+    tree = BKTree()
+    duplicate_of = np.full(len(hashes), -1, np.int64)
+    for i, value in enumerate(int(h) for h in hashes):
+        found = tree.query(value, max_distance)
+        if found:
+            duplicate_of[i] = min(found)[1]
+            continue
+        tree.add(value, i)
+    return duplicate_of
@@ -0,0 +1,82 @@
+import os
+import csv
+import tensorflow as tf
+from PIL import Image
+
+MANIFEST_FIELDS = ('path', 'label', 'width', 'height', 'channel', 'format',
+                   'valid')
+MANIFEST_SUFFIX = '.manifest.csv'
+
+# tf.io.decode_csv defaults, one per field of MANIFEST_FIELDS.
+_RECORD_DEFAULTS = [[''], [''], [0], [0], [0], [''], [0]]
+
+# End marker of a complete file of the format and the number of tail
+# bytes searched for it. Decoders accept JPEGs with padding or
+# metadata after the end marker.
+_END_MARKERS = {
+    'JPEG': (b'\xff\xd9', 1024),
+    'PNG': (b'IEND', 12),
+}
+
+
+def inspect_image(path):
+    """
+    Read only the header (and the last few bytes) of an image.
+    Returns (width, height, channel, format, valid).
+    """
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            channel = len(image.getbands())
+            image_format = image.format
+    except Exception:
+        return 0, 0, 0, '', False
+
+    if image_format not in _END_MARKERS:
+        return width, height, channel, image_format, True
+    marker, tail_size = _END_MARKERS[image_format]
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - tail_size, 0))
+        valid = marker in f.read(tail_size)
+    return width, height, channel, image_format, valid
+
+
+def is_manifest(path):
+    return path.endswith(MANIFEST_SUFFIX)
+
+
+def manifest_path(data_txt_file):
+    return os.path.splitext(data_txt_file)[0] + MANIFEST_SUFFIX
+
+
+def write_manifest(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as stream:
+        writer = csv.writer(stream)
+        writer.writerow(MANIFEST_FIELDS)
+        for row in rows:
+            writer.writerow((*row[:-1], int(row[-1])))
+
+
+def read_manifest(path):
+    with open(path, 'r', encoding='utf-8', newline='') as stream:
+        rows = []
+        for row in csv.DictReader(stream):
+            for key in ('width', 'height', 'channel', 'valid'):
+                row[key] = int(row[key])
+            rows.append(row)
+    return rows
+
+
+def parse_manifest_lines(lines):
+    """
+    In-graph parse of a batch of manifest lines (header excluded).
+    Invalid rows are dropped. Returns dict of path, label, size (h, w).
+    """
+    path, label, width, height, _, _, valid = tf.io.decode_csv(
+        lines, record_defaults=_RECORD_DEFAULTS)
+    valid = valid > 0
+    return {'path': tf.boolean_mask(path, valid),
+            'label': tf.boolean_mask(label, valid),
+            'size': tf.boolean_mask(tf.stack([height, width], axis=1),
+                                    valid)}
@@ -0,0 +1,64 @@
+import tensorflow as tf
+
+_MASK32 = 0xFFFFFFFF
+_MIX = 0x45D9F3B
+
+
+def _round_function(right, key, half_mask):
+    """
+    Integer hash of (right, key) reduced to the half width.
+    Products stay below 2**63, so nothing overflows int64.
+    """
+    x = tf.bitwise.bitwise_and(right * _MIX + key, _MASK32)
+    x = tf.bitwise.bitwise_xor(x, tf.bitwise.right_shift(x, 16))
+    x = tf.bitwise.bitwise_and(x * _MIX, _MASK32)
+    x = tf.bitwise.bitwise_xor(x, tf.bitwise.right_shift(x, 16))
+    return tf.bitwise.bitwise_and(x, half_mask)
+
+
+def _feistel(index, keys, half_bits):
+    half_mask = tf.constant((1 << half_bits) - 1, tf.int64)
+    half_bits = tf.constant(half_bits, tf.int64)
+    left = tf.bitwise.right_shift(index, half_bits)
+    right = tf.bitwise.bitwise_and(index, half_mask)
+    for key in tf.unstack(keys):
+        left, right = right, tf.bitwise.bitwise_xor(
+            left, _round_function(right, key, half_mask))
+    return tf.bitwise.bitwise_or(tf.bitwise.left_shift(left, half_bits),
+                                 right)
+
+
+def permute(index, n, seed, rounds=4):
+    """
+    Position of `index` (int64 tensor in [0, n)) in a pseudo-random
+    permutation of range(n) keyed by `seed` (shape (2,)).
+    A Feistel network is a bijection on [0, 4**half_bits); cycle-walking
+    maps values outside [0, n) again until they land inside, which keeps
+    it a bijection on range(n). Nothing of size n is ever materialized.
+    """
+    half_bits = max((max(n - 1, 1).bit_length() + 1) // 2, 1)
+    keys = tf.random.stateless_uniform((rounds,), seed=seed, minval=0,
+                                       maxval=_MASK32 + 1, dtype=tf.int64)
+    index = tf.cast(index, tf.int64)
+    value = _feistel(index, keys, half_bits)
+    # the domain is smaller than 4n, so few values walk more than once
+    value, = tf.while_loop(
+        lambda value: tf.reduce_any(value >= n),
+        lambda value: (tf.where(value >= n,
+                                _feistel(value, keys, half_bits),
+                                value),),
+        (value,))
+    return value
+
+
+def permutation_dataset(n, seed, start=0, shuffle=True, block=4096):
+    """
+    int64 dataset of a permutation of range(n) from position `start`.
+    Skipping costs nothing, indices are computed `block` at a time.
+    """
+    dataset = tf.data.Dataset.range(start, n)
+    if not shuffle:
+        return dataset
+    return dataset.batch(block).map(
+        lambda index: permute(index, n, seed),
+        num_parallel_calls=tf.data.experimental.AUTOTUNE).unbatch()
@@ -0,0 +1,79 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+
+class ResizeCache:
+    """
+    Persistent cache of resized uint8 images.
+    One entry per source file, keyed by (path, mtime, file size),
+    holds any number of resolutions. Entries are replaced atomically,
+    so concurrent runs can share a cache directory.
+    """
+    def __init__(self, cache_dir, levels=None):
+        """
+        levels: heights also stored on every miss (pyramid),
+                widths follow the aspect ratio of the requested size.
+        """
+        self.cache_dir = cache_dir
+        self.levels = tuple(levels or ())
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_path(self, path):
+        stat = os.stat(path)
+        key = f'{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}'
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.npz')
+
+    def _read_entry(self, entry):
+        try:
+            with np.load(entry) as arrays:
+                return dict(arrays)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, path, name):
+        """
+        Returns (image, True) on a hit, (empty image, False) on a miss.
+        """
+        path, name = _to_str(path), _to_str(name)
+        try:
+            entry = self.entry_path(path)
+        except OSError:
+            return np.zeros((0, 0, 0), np.uint8), False
+        try:
+            # loads only the requested resolution of the entry
+            with np.load(entry) as arrays:
+                if name not in arrays.files:
+                    return np.zeros((0, 0, 0), np.uint8), False
+                return arrays[name], True
+        except (OSError, ValueError):
+            return np.zeros((0, 0, 0), np.uint8), False
+
+    def store(self, path, names, *images):
+        """
+        Add `images` under `names` to the entry of `path`,
+        keeping the resolutions it already has.
+        """
+        path = _to_str(path)
+        entry = self.entry_path(path)
+        arrays = self._read_entry(entry)
+        arrays.update(zip((_to_str(n) for n in names), images))
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(entry),
+                                         suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                np.savez(stream, **arrays)
+            os.replace(temp_path, entry)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return True
+
+
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
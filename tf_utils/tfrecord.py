@@ -0,0 +1,50 @@
+import os
+import glob
+import tensorflow as tf
+
+TFRECORD_PATTERN = 'shard-{:05d}-of-{:05d}.tfrecord'
+
+
+def _bytes_feature(value):
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+
+
+def _int64_feature(value):
+    return tf.train.Feature(int64_list=tf.train.Int64List(value=[value]))
+
+
+def serialize_example(image, label=None):
+    """
+    image: uint8 numpy array (H, W, C)
+    label: int or None
+    """
+    feature = {'image': _bytes_feature(image.tobytes())}
+    if label is not None:
+        feature['label'] = _int64_feature(int(label))
+    example = tf.train.Example(features=tf.train.Features(feature=feature))
+    return example.SerializeToString()
+
+
+def parse_example(serialized, shape, use_label=False):
+    """
+    Parse a serialized example into uint8 image (H, W, C) and label.
+    """
+    features = {'image': tf.io.FixedLenFeature([], tf.string)}
+    if use_label:
+        features['label'] = tf.io.FixedLenFeature([], tf.int64)
+    parsed = tf.io.parse_single_example(serialized, features)
+    image = tf.reshape(tf.io.decode_raw(parsed['image'], tf.uint8), shape)
+    if not use_label:
+        return image
+    return image, parsed['label']
+
+
+def find_tfrecords(tfrecord_dir):
+    shards = sorted(glob.glob(os.path.join(tfrecord_dir, '*.tfrecord')))
+    assert shards, 'TFRecord file not found'
+    return shards
+
+
+def get_shard_paths(output_dir, n_shard):
+    return [os.path.join(output_dir, TFRECORD_PATTERN.format(i, n_shard))
+            for i in range(n_shard)]
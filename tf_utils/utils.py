@@ -1,11 +1,16 @@
 import os
 import glob
+import json
 import yaml
+import tempfile
 import numpy as np
 import tensorflow as tf
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
 IMAGE_EXT = {'jpg', 'jpeg', 'png'}
+STORE_META = 'meta.yaml'
+INDEX_SUFFIX = '.index.json'
 
 
 def extension_pattern(extension):
@@ -16,15 +21,87 @@ def extension_pattern(extension):
 def find_images(path):
     if os.path.isfile(path):
         return [path]
-    images = []
-    for EXT in IMAGE_EXT:
-        images.extend(glob.glob(os.path.join(path, extension_pattern(EXT)),
-                                recursive=True))
-    images.sort()
+    images = [os.path.join(path, image) for image in scan_images(path)[0]]
     assert images, 'Image file not found'
     return images
 
 
+def _scan_dir(path):
+    """
+    List image files and subdirectories of a single directory.
+    """
+    files = []
+    dirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                dirs.append(entry.name)
+            elif entry.name.rsplit('.', 1)[-1].lower() in IMAGE_EXT:
+                files.append(entry.name)
+    return files, dirs
+
+
+def _write_atomic(path, text):
+    """
+    Write through a temporary file, so readers never see a partial file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                     suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as stream:
+            stream.write(text)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def scan_images(data_dir, index=None, n_thread=None):
+    """
+    Walk `data_dir` level by level with a thread pool.
+    With `index`, the directory listing of an earlier scan, directories
+    whose mtime did not change reuse their listing.
+    Returns (sorted image paths relative to data_dir, new index,
+    changed flag).
+    """
+    index = index or {}
+
+    def _visit(rel_dir):
+        path = os.path.join(data_dir, rel_dir)
+        mtime = os.stat(path).st_mtime_ns
+        cached = index.get(rel_dir)
+        if cached is not None and cached['mtime'] == mtime:
+            return rel_dir, cached, False
+        files, dirs = _scan_dir(path)
+        entry = {'mtime': mtime, 'files': sorted(files), 'dirs': sorted(dirs)}
+        # e.g. the txt written into data_dir changes the mtime only
+        changed = cached is None or any(cached[key] != entry[key]
+                                        for key in ('files', 'dirs'))
+        return rel_dir, entry, changed
+
+    new_index = {}
+    changed = False
+    frontier = ['']
+    with ThreadPoolExecutor(max_workers=n_thread) as executor:
+        while frontier:
+            next_frontier = []
+            for rel_dir, entry, scanned in executor.map(_visit, frontier):
+                new_index[rel_dir] = entry
+                changed |= scanned
+                next_frontier.extend(os.path.join(rel_dir, d)
+                                     for d in entry['dirs'])
+            frontier = next_frontier
+    changed |= set(index) != set(new_index)
+
+    images = [os.path.join(rel_dir, f)
+              for rel_dir, entry in new_index.items()
+              for f in entry['files']]
+    images.sort()
+    return images, new_index, changed
+
+
 def str_to_bool(value):
     if isinstance(value, bool):
         return value
@@ -97,6 +174,19 @@ def get_config(config):
         return yaml.load(stream, Loader=yaml.FullLoader)
 
 
+def write_store_meta(store_dir, **meta):
+    with open(os.path.join(store_dir, STORE_META), 'w') as stream:
+        yaml.dump(meta, stream)
+
+
+def read_store_meta(store_dir):
+    meta_path = os.path.join(store_dir, STORE_META)
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"'{STORE_META}' not found in {store_dir}")
+    with open(meta_path, 'r') as stream:
+        return yaml.load(stream, Loader=yaml.FullLoader)
+
+
 def find_config(checkpoint):
     if not os.path.isdir(checkpoint):
         checkpoint = os.path.dirname(checkpoint)
@@ -110,6 +200,10 @@ def check_dataset_config(config, make_txt=False):
         data_conf = config['dataset']
     else:
         data_conf = config
+    if data_conf.get('backend', 'file') != 'file':
+        if not os.path.exists(data_conf.get('backend_path') or ''):
+            raise FileNotFoundError("'backend_path' not found")
+        return
     if not make_txt and data_conf['train_data_txt'] is not None:
         if not os.path.exists(data_conf['train_data_txt']):
             raise FileNotFoundError("'train_data_txt' not found")
@@ -132,7 +226,9 @@ def make_dataset_txt(data_dir,
                      output_path=None,
                      train_test_split=False,
                      labeled_dir=False,
-                     prefix=''):
+                     prefix='',
+                     incremental=True,
+                     n_thread=None):
     if train_test_split:
         if set(os.listdir(data_dir)).intersection(
                 {'train', 'test'}) != {'train', 'test'}:
@@ -143,39 +239,45 @@ def make_dataset_txt(data_dir,
                                                           'train.txt'),
                                  train_test_split=False,
                                  labeled_dir=labeled_dir,
-                                 prefix='train'),
+                                 prefix='train',
+                                 incremental=incremental,
+                                 n_thread=n_thread),
                 make_dataset_txt(data_dir=os.path.join(data_dir, 'test'),
                                  output_path=os.path.join(data_dir,
                                                           'test.txt'),
                                  train_test_split=False,
                                  labeled_dir=labeled_dir,
-                                 prefix='test'))
+                                 prefix='test',
+                                 incremental=incremental,
+                                 n_thread=n_thread))
 
     if output_path is None:
         output_path = os.path.join(data_dir, 'train.txt')
-    if data_dir.endswith('/'):
-        split_length = len(data_dir)
-    else:
-        split_length = len(data_dir) + 1
-
-    IMAGE_EXT = {'jpg', 'jpeg', 'png'}
-
-    def extension_pattern(extension):
-        pattern = ''.join(f'[{e.lower()}{e.upper()}]' for e in extension)
-        return f'**/*.{pattern}'
-
-    images = []
-    for EXT in IMAGE_EXT:
-        images.extend(glob.glob(os.path.join(data_dir, extension_pattern(EXT)),
-                                recursive=True))
-    images.sort()
 
-    with open(output_path, 'w', encoding='utf-8') as txt_file:
-        for image in images:
-            if labeled_dir:
-                label = ',' + os.path.basename(os.path.dirname(image))
-            else:
-                label = ''
-            line = f'{os.path.join(prefix, image[split_length:])}{label}\n'
-            txt_file.write(line)
+    # the index holds the listing and options of the txt written last
+    index_file = output_path + INDEX_SUFFIX
+    options = {'labeled_dir': bool(labeled_dir), 'prefix': prefix}
+    index = {}
+    if incremental and os.path.exists(index_file):
+        with open(index_file, 'r', encoding='utf-8') as stream:
+            index = json.load(stream)
+    images, dirs, changed = scan_images(data_dir,
+                                        index=index.get('dirs'),
+                                        n_thread=n_thread)
+    changed |= index.get('options') != options
+    if not changed and os.path.exists(output_path):
+        return output_path
+
+    lines = []
+    for image in images:
+        if labeled_dir:
+            label = ',' + os.path.basename(os.path.dirname(image))
+        else:
+            label = ''
+        lines.append(f'{os.path.join(prefix, image)}{label}\n')
+    _write_atomic(output_path, ''.join(lines))
+    # written after the txt, a stopped run rewrites the txt next time
+    if incremental:
+        _write_atomic(index_file, json.dumps({'options': options,
+                                              'dirs': dirs}))
     return output_path